@@ -1,3 +1,5 @@
+import os
+
 POSITIONS = {1: "GK", 2: "DEF", 3: "MID", 4: "FWD"}
 TOTAL_BUDGET = 100.0
 VALID_FORMATIONS = [
@@ -9,4 +11,88 @@ VALID_FORMATIONS = [
 ]
 
 BASE_IMAGE_URL = "https://resources.premierleague.com/premierleague/photos/players/110x140/"
-BASE_API_URL = "https://fantasy.premierleague.com/api/"
+# Upstream FPL API; point at benchmarks/stub_api.py for offline load tests
+BASE_API_URL = os.environ.get("FPL_API_URL", "https://fantasy.premierleague.com/api/").rstrip("/") + "/"
+
+# Trained models are persisted here, one artifact per data snapshot
+MODEL_REGISTRY_DIR = os.environ.get("FPL_MODEL_DIR", "model_store")
+MODEL_REGISTRY_KEEP = 3
+
+# Local snapshot of the FPL API payloads
+SNAPSHOT_DIR = os.environ.get("FPL_SNAPSHOT_DIR", "snapshot_cache")
+SNAPSHOT_TTL = int(os.environ.get("FPL_SNAPSHOT_TTL", "300"))
+SNAPSHOT_TIMEOUT = (3.05, 10)
+SNAPSHOT_OFFLINE = os.environ.get("FPL_SNAPSHOT_OFFLINE", "0") == "1"
+
+# Background snapshot refresh, polling faster around gameweek deadlines
+REFRESH_SCHEDULER_ENABLED = os.environ.get("FPL_REFRESH_SCHEDULER", "1") == "1"
+REFRESH_FAST_INTERVAL = 60
+REFRESH_SLOW_INTERVAL = 30 * 60
+REFRESH_DEADLINE_WINDOW = 3 * 60 * 60
+
+# Model training: worker processes and total CPU threads shared between them
+TRAIN_WORKERS = int(os.environ.get("FPL_TRAIN_WORKERS", "1"))
+TRAIN_CPU_BUDGET = int(os.environ.get("FPL_TRAIN_CPU_BUDGET", str(os.cpu_count() or 1)))
+
+# Transfer planning
+BENCH_WEIGHT = 0.1
+TRANSFER_HIT_COST = 4
+MAX_FREE_TRANSFERS = 5
+PLANNER_POOL_SIZE = 40
+PLANNER_TIME_LIMIT = 20
+# Warm-start solutions kept, one per recently planned squad
+PLANNER_WARM_STARTS = 256
+MAX_PER_CLUB = 3
+TEAM_CACHE_SIZE = 256
+
+# Pre-serialized /top and /team bodies per snapshot; clients revalidate with
+# If-None-Match after RESPONSE_MAX_AGE seconds
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_MAX_AGE = int(os.environ.get("FPL_RESPONSE_MAX_AGE", "0"))
+
+# Instrumentation: Server-Timing on every response (or per request with
+# "X-Server-Timing: 1") and opt-in stack sampling of requests slower than
+# PROFILE_SLOW_MS, for PROFILE_SAMPLE_RATE of requests
+SERVER_TIMING_ENABLED = os.environ.get("FPL_SERVER_TIMING", "0") == "1"
+PROFILE_SLOW_MS = float(os.environ.get("FPL_PROFILE_SLOW_MS", "0"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("FPL_PROFILE_SAMPLE_RATE", "0.05"))
+
+# Worker processes for model training off the event loop
+CPU_POOL_WORKERS = int(os.environ.get("FPL_CPU_POOL_WORKERS", "1"))
+
+# Batch squad optimisation for many managers: solver processes, and how many
+# snapshot/risk templates each keeps built
+BATCH_SOLVER_WORKERS = int(os.environ.get("FPL_BATCH_SOLVER_WORKERS", str(os.cpu_count() or 1)))
+BATCH_TEMPLATES_KEEP = 4
+
+# Per-gameweek player history (memory-mapped column files)
+HISTORY_DIR = os.environ.get("FPL_HISTORY_DIR", "history_store")
+
+# Per-gameweek training: past seasons as merged_gw.csv exports (comma-separated
+# globs) plus the current season from the history store
+HISTORY_TRAINING = os.environ.get("FPL_HISTORY_TRAINING", "1") == "1"
+HISTORY_CSV_PATHS = [p for p in os.environ.get("FPL_HISTORY_CSV", "").split(",") if p]
+HISTORY_CSV_CHUNKSIZE = 50_000
+HISTORY_MIN_GAMEWEEKS = 4
+
+# Monte Carlo points simulation, run once per snapshot. Risk profiles weight
+# each player's simulated standard deviation in the squad objective
+SIM_SCENARIOS = int(os.environ.get("FPL_SIM_SCENARIOS", "10000"))
+SIM_SEED = 42
+RISK_PROFILES = {"safe": -0.5, "neutral": 0.0, "upside": 0.5}
+
+# Inference-only serving: never train, serve the newest stored model artifact
+# and import only the libraries it needs
+INFERENCE_ONLY = os.environ.get("FPL_INFERENCE_ONLY", "0") == "1"
+
+# Model selection: k-fold CV with successive halving under a per-position
+# time budget in estimated seconds of fitting (from data size and estimator
+# size, not measured, so selection does not depend on load); results cached
+# per feature set, data and budget
+SELECTION_BUDGET = float(os.environ.get("FPL_SELECTION_BUDGET", "30"))
+SELECTION_FOLDS = 5
+SELECTION_ETA = 2
+EARLY_STOPPING_ROUNDS = 20
+MAX_BOOSTING_ROUNDS = 500
+SELECTION_CACHE_DIR = os.environ.get("FPL_SELECTION_CACHE_DIR", os.path.join(MODEL_REGISTRY_DIR, "selection"))
+SELECTION_CACHE_KEEP = 32
@@ -0,0 +1,17 @@
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access.
+
+    Keeps heavy libraries (pandas, scikit-learn, XGBoost, CatBoost, PuLP) off
+    the startup path; they load only when a code path actually uses them.
+    """
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self.__name__), attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
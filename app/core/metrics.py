@@ -0,0 +1,155 @@
+import contextvars
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Per-request list of (stage, seconds), set by the timing middleware
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """Cumulative histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+            for key, series in items:
+                labels = [f'{name}="{value}"' for name, value in zip(self.label_names, key)]
+                bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+                counts = series["buckets"] + [series["count"]]
+                for bound, count in zip(bounds, counts):
+                    bucket_labels = ",".join(labels + [f'le="{bound}"'])
+                    lines.append(f"{self.name}_bucket{{{bucket_labels}}} {count}")
+                suffix = f"{{{','.join(labels)}}}" if labels else ""
+                lines.append(f"{self.name}_sum{suffix} {series['sum']}")
+                lines.append(f"{self.name}_count{suffix} {series['count']}")
+        return "\n".join(lines)
+
+
+STAGE_SECONDS = Histogram("fpl_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"])
+REQUEST_SECONDS = Histogram("fpl_request_duration_seconds", "End-to-end request latency",
+                            ["method", "path", "status"])
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def instrument(stage):
+    """Decorator form of ``timed``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request_timings():
+    timings = []
+    return timings, _request_timings.set(timings)
+
+
+def end_request_timings(token):
+    _request_timings.reset(token)
+
+
+def server_timing_header(timings, total):
+    """Format stage timings as a Server-Timing header, summing repeated stages."""
+    durations = {}
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    parts = [f"{stage.replace(' ', '_')};dur={seconds * 1000:.2f}" for stage, seconds in durations.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def render_metrics():
+    return "\n".join(h.render() for h in (STAGE_SECONDS, REQUEST_SECONDS)) + "\n"
+
+
+class StackSampler:
+    """Samples the Python stacks of all other threads at a fixed interval.
+
+    Only frames from files under ``root`` are kept, so idle server threads
+    do not show up. Samples from concurrent requests are mixed together.
+    """
+
+    def __init__(self, interval=0.005, root=None, max_depth=12):
+        self.interval = interval
+        self.root = root or os.getcwd()
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    if code.co_filename.startswith(self.root):
+                        stack.append(f"{os.path.relpath(code.co_filename, self.root)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if stack:
+                    self.samples[" <- ".join(stack)] += 1
+
+    def report(self, top=15):
+        total = sum(self.samples.values()) or 1
+        return "\n".join(f"{count / total:6.1%} {count:5d}  {stack}" for stack, count in self.samples.most_common(top))
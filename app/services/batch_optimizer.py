@@ -0,0 +1,202 @@
+import asyncio
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from app.core.config import TOTAL_BUDGET, MAX_PER_CLUB, RISK_PROFILES, BATCH_TEMPLATES_KEEP
+from app.services.executors import run_in_thread, solver_pool
+from app.services.optimizer_service import OptimizerService, SquadModel
+
+# Worker side: template path -> SquadModel built from it
+_models = OrderedDict()
+
+
+def _model(path):
+    model = _models.get(path)
+    if model is None:
+        with open(path, "rb") as f:
+            players, scores = pickle.load(f)
+        model = _models[path] = SquadModel(players, scores=scores)
+        while len(_models) > BATCH_TEMPLATES_KEEP:
+            _models.popitem(last=False)
+    _models.move_to_end(path)
+    return model
+
+
+def _solve(path, kwargs):
+    """One manager's solve in a solver worker; runs in the pool."""
+    start = time.perf_counter()
+    try:
+        team = _model(path).solve(**kwargs)
+    except Exception as e:
+        return {"error": str(e)}
+    owned = set(kwargs["owned"])
+    squad = [p for group in (team["starting_xi"], team["bench"]) for players in group.values() for p in players]
+    return {
+        **team,
+        "budget": kwargs["budget"],
+        "transfers": sum(1 for p in squad if p["id"] not in owned) if owned else None,
+        "solve_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+class BatchOptimizer:
+    """SquadModel solves for many managers, spread over the solver pool.
+
+    The candidates and objective of a snapshot and risk profile are written
+    once to a template file. Each worker builds a SquadModel from it on first
+    use and re-solves that model for every manager it is sent, changing only
+    bounds and constraint constants (budget, locks, club limit, formations,
+    transfers from the current squad).
+
+    Templates are held by the batches using them; an evicted template is
+    deleted once its last batch releases it.
+    """
+
+    _templates = OrderedDict()
+    # Template path -> number of batches holding it
+    _holders = {}
+    _lock = threading.Lock()
+    _dir = None
+
+    @staticmethod
+    def template(snapshot, risk="neutral"):
+        """Path of the template for ``snapshot`` and ``risk``, written on first use.
+
+        The caller holds the template until it calls release() with the path.
+        """
+        key = (snapshot.version, risk)
+        with BatchOptimizer._lock:
+            path = BatchOptimizer._templates.get(key)
+            if path is not None:
+                BatchOptimizer._templates.move_to_end(key)
+                BatchOptimizer._holders[path] = BatchOptimizer._holders.get(path, 0) + 1
+                return path
+
+            if BatchOptimizer._dir is None:
+                BatchOptimizer._dir = tempfile.mkdtemp(prefix="fpl-batch-")
+            scores = snapshot.candidate_scores(risk)
+            path = os.path.join(BatchOptimizer._dir, f"template_{snapshot.version}_{risk}.pkl")
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump((snapshot.table.candidates, None if scores is None else list(map(float, scores))), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+
+            BatchOptimizer._templates[key] = path
+            BatchOptimizer._holders[path] = BatchOptimizer._holders.get(path, 0) + 1
+            while len(BatchOptimizer._templates) > BATCH_TEMPLATES_KEEP:
+                _, old = BatchOptimizer._templates.popitem(last=False)
+                if old not in BatchOptimizer._holders:
+                    BatchOptimizer._remove(old)
+            return path
+
+    @staticmethod
+    def release(path):
+        """Drop one hold on a template from template(), deleting it if it was evicted meanwhile."""
+        with BatchOptimizer._lock:
+            holders = BatchOptimizer._holders.get(path, 0) - 1
+            if holders > 0:
+                BatchOptimizer._holders[path] = holders
+                return
+            BatchOptimizer._holders.pop(path, None)
+            if path not in BatchOptimizer._templates.values():
+                BatchOptimizer._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def prepare(snapshot, manager):
+        """``(risk, solve kwargs)`` for a manager state; raises ValueError when it is invalid.
+
+        ``manager`` has optional "squad" (current player ids), "bank",
+        "budget", "max_transfers", "locked", "excluded", "max_per_club",
+        "formations" (names like "4-4-2") and "risk". Without a budget it is
+        the current squad's value plus the bank, or TOTAL_BUDGET for a manager
+        with no squad.
+        """
+        risk = manager.get("risk") or "neutral"
+        if risk not in RISK_PROFILES:
+            raise ValueError(f"Invalid risk profile '{risk}'. Must be one of {list(RISK_PROFILES)}")
+
+        owned = list(dict.fromkeys(manager.get("squad") or ()))
+        max_transfers = manager.get("max_transfers")
+        if max_transfers is not None and not owned:
+            raise ValueError("max_transfers needs the manager's current squad")
+        budget = manager.get("budget")
+        if budget is None:
+            if owned:
+                unknown = [pid for pid in owned if snapshot.table.get(pid) is None]
+                if unknown:
+                    raise ValueError(f"Unknown players in squad: {unknown}")
+                budget = sum(snapshot.table.get(pid)["price"] for pid in owned) + (manager.get("bank") or 0.0)
+            else:
+                budget = TOTAL_BUDGET
+
+        locked = manager.get("locked") or ()
+        excluded = manager.get("excluded") or ()
+        max_per_club = manager.get("max_per_club") or MAX_PER_CLUB
+        formations = manager.get("formations")
+        formations = OptimizerService.formation_indices(formations) if formations else None
+        # Same validation as /team
+        snapshot.team_constraints(budget, locked, excluded, max_per_club, formations)
+        return risk, {
+            "budget": round(budget, 1),
+            "locked": tuple(locked),
+            "excluded": tuple(excluded),
+            "max_per_club": max_per_club,
+            "formations": tuple(formations) if formations else None,
+            "owned": tuple(owned),
+            "max_transfers": max_transfers,
+        }
+
+    @staticmethod
+    async def stream(snapshot, managers):
+        """Yield ``{"id", ...}`` per manager as its solve finishes, in completion order."""
+        pool = solver_pool()
+        tasks = []
+        paths = {}
+
+        async def solve(manager_id, path, kwargs):
+            # A dead worker or a failed submit only fails this manager
+            try:
+                return manager_id, await asyncio.wrap_future(pool.submit(_solve, path, kwargs))
+            except Exception as e:
+                return manager_id, {"error": str(e) or type(e).__name__}
+
+        try:
+            for manager in managers:
+                try:
+                    risk, kwargs = BatchOptimizer.prepare(snapshot, manager)
+                except ValueError as e:
+                    yield {"id": manager.get("id"), "error": str(e)}
+                    continue
+                if risk not in paths:
+                    paths[risk] = await run_in_thread(BatchOptimizer.template, snapshot, risk)
+                tasks.append(asyncio.ensure_future(solve(manager.get("id"), paths[risk], kwargs)))
+
+            for next_done in asyncio.as_completed(tasks):
+                manager_id, result = await next_done
+                yield {"id": manager_id, "gameweek": snapshot.gw, **result}
+        finally:
+            for task in tasks:
+                task.cancel()
+            for path in paths.values():
+                BatchOptimizer.release(path)
+
+    @staticmethod
+    def cleanup():
+        with BatchOptimizer._lock:
+            if BatchOptimizer._dir is not None:
+                shutil.rmtree(BatchOptimizer._dir, ignore_errors=True)
+            BatchOptimizer._dir = None
+            BatchOptimizer._templates.clear()
+            BatchOptimizer._holders.clear()
@@ -0,0 +1,22 @@
+import asyncio
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one shared future.
+
+    The first caller starts the work; callers arriving while it runs await
+    the same result. The work is shielded, so a cancelled request does not
+    cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, factory):
+        """Await ``factory()`` (a coroutine factory), sharing it per ``key``."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
@@ -0,0 +1,277 @@
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from app.core.lazy import lazy_import
+
+logger = logging.getLogger(__name__)
+
+pd = lazy_import("pandas")
+
+
+class CompiledLinear:
+    """Linear model as a coefficient vector."""
+
+    def __init__(self, coef, intercept):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coef + self.intercept
+
+    def contributions(self, X):
+        """Coefficient x (value - mean over X), as Explainer does for linear models."""
+        values = np.asarray(X, dtype=np.float64)
+        mean = values.mean(axis=0)
+        return (values - mean) * self.coef, np.full(len(values), self.intercept + mean @ self.coef)
+
+
+class CompiledTrees:
+    """Tree ensemble flattened into node arrays.
+
+    Every tree's nodes live in the same ``feature``, ``threshold``, ``left``,
+    ``right``, ``default_left`` and ``value`` arrays; ``roots`` holds each
+    tree's first node. Leaves point to themselves, so all trees are walked
+    together for ``depth`` steps with no per-tree branching. A sample goes
+    left when ``x < threshold`` (``strict``, XGBoost) or ``x <= threshold``
+    (scikit-learn, CatBoost), and follows ``default_left`` when missing.
+    Inputs are compared as float32, like the libraries do. The output is
+    ``scale * sum of leaf values + bias``.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots, depth, scale, bias, strict,
+                 n_features):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.depth = int(depth)
+        self.scale = float(scale)
+        self.bias = float(bias)
+        self.strict = bool(strict)
+        self.n_features = int(n_features)
+
+    def _step(self, X, rows, node):
+        x = X[rows, self.feature[node]]
+        threshold = self.threshold[node]
+        go_left = x < threshold if self.strict else x <= threshold
+        go_left = np.where(np.isnan(x), self.default_left[node], go_left)
+        return np.where(go_left, self.left[node], self.right[node])
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            node = self._step(X, rows, node)
+        return self.scale * self.value[node].sum(axis=1) + self.bias
+
+    def contributions(self, X):
+        """Path attributions: each step's change in node value goes to the split feature."""
+        X = np.asarray(X, dtype=np.float32)
+        n = len(X)
+        rows = np.arange(n)[:, None]
+        flat_rows = np.repeat(np.arange(n), len(self.roots)) * self.n_features
+        contrib = np.zeros(n * self.n_features)
+        node = np.broadcast_to(self.roots, (n, len(self.roots)))
+        for _ in range(self.depth):
+            nxt = self._step(X, rows, node)
+            contrib += np.bincount(flat_rows + self.feature[node].ravel(),
+                                   weights=(self.value[nxt] - self.value[node]).ravel(),
+                                   minlength=n * self.n_features)
+            node = nxt
+        base = self.scale * self.value[self.roots].sum() + self.bias
+        return self.scale * contrib.reshape(n, self.n_features), np.full(n, base)
+
+
+class _TableBuilder:
+    """Accumulates tree nodes into the flat CompiledTrees arrays."""
+
+    def __init__(self):
+        self.feature, self.threshold, self.left, self.right = [], [], [], []
+        self.default_left, self.value, self.roots = [], [], []
+        self.depth = 0
+
+    def node(self):
+        self.feature.append(0)
+        self.threshold.append(0.0)
+        self.left.append(len(self.left))
+        self.right.append(len(self.right))
+        self.default_left.append(False)
+        self.value.append(0.0)
+        return len(self.value) - 1
+
+    def split(self, i, feature, threshold, left, right, default_left=False):
+        self.feature[i] = feature
+        self.threshold[i] = threshold
+        self.left[i] = left
+        self.right[i] = right
+        self.default_left[i] = default_left
+
+    def build(self, scale, bias, strict, n_features):
+        return CompiledTrees(self.feature, self.threshold, self.left, self.right, self.default_left, self.value,
+                             self.roots, self.depth, scale, bias, strict, n_features)
+
+
+class ModelCompiler:
+    """Exports the selected position models to NumPy-only evaluators.
+
+    Each export is checked against the source model on probe inputs built
+    from the model's own split thresholds; models that do not match within
+    TOLERANCE are served by their library instead.
+    """
+    TOLERANCE = 1e-4
+    PROBE_ROWS = 512
+
+    @staticmethod
+    def compile_all(models):
+        """``{pos: (model, feats, name)}`` with every model that can be compiled replaced."""
+        compiled = {}
+        for pos, (model, feats, name) in models.items():
+            exported = ModelCompiler.compile(model, name, feats)
+            compiled[pos] = (exported if exported is not None else model, feats, name)
+        return compiled
+
+    @staticmethod
+    def compile(model, name, feats):
+        """Verified NumPy evaluator for ``model``, or None."""
+        try:
+            if name == "Linear":
+                exported = CompiledLinear(model.coef_, model.intercept_)
+            elif name == "RandomForest":
+                exported = ModelCompiler._forest(model, len(feats))
+            elif name == "XGB":
+                exported = ModelCompiler._xgboost(model, feats)
+            elif name == "CatBoost":
+                exported = ModelCompiler._catboost(model, len(feats))
+            else:
+                return None
+        except (AttributeError, KeyError, ValueError, OSError):
+            logger.exception("Could not export the %s model", name)
+            return None
+
+        probe = pd.DataFrame(ModelCompiler._probe(exported, len(feats)), columns=feats)
+        expected = np.asarray(model.predict(probe), dtype=np.float64)
+        actual = exported.predict(probe)
+        error = float(np.max(np.abs(expected - actual))) if len(probe) else 0.0
+        if not np.allclose(actual, expected, rtol=ModelCompiler.TOLERANCE, atol=ModelCompiler.TOLERANCE):
+            logger.warning("Compiled %s model differs from the source by up to %.3g; not using it", name, error)
+            return None
+        return exported
+
+    @staticmethod
+    def _probe(exported, n_features):
+        """Random rows whose values sit on and around the split thresholds of every feature."""
+        rng = np.random.default_rng(0)
+        columns = []
+        for f in range(n_features):
+            values = np.array([0.0, 1.0])
+            if isinstance(exported, CompiledTrees):
+                splits = exported.threshold[(exported.left != np.arange(len(exported.left))) & (exported.feature == f)]
+                splits = splits.astype(np.float32)
+                values = np.concatenate([values, splits, np.nextafter(splits, np.float32(np.inf)),
+                                         np.nextafter(splits, np.float32(-np.inf))])
+            spread = max(float(np.ptp(values)), 1.0)
+            columns.append(np.where(rng.random(ModelCompiler.PROBE_ROWS) < 0.8,
+                                    rng.choice(values, ModelCompiler.PROBE_ROWS),
+                                    rng.uniform(values.min() - spread, values.max() + spread,
+                                                ModelCompiler.PROBE_ROWS)))
+        return np.column_stack(columns).astype(np.float32).astype(np.float64)
+
+    @staticmethod
+    def _forest(model, n_features):
+        table = _TableBuilder()
+        for tree in model.estimators_:
+            t = tree.tree_
+            missing_left = getattr(t, "missing_go_to_left", None)
+            offset = len(table.value)
+            for i in range(t.node_count):
+                table.node()
+            table.roots.append(offset)
+            for i in range(t.node_count):
+                table.value[offset + i] = t.value[i, 0, 0]
+                if t.children_left[i] >= 0:
+                    table.split(offset + i, t.feature[i], t.threshold[i],
+                                offset + t.children_left[i], offset + t.children_right[i],
+                                bool(missing_left[i]) if missing_left is not None else False)
+            table.depth = max(table.depth, t.max_depth)
+        return table.build(1 / len(model.estimators_), 0.0, False, n_features)
+
+    @staticmethod
+    def _xgboost(model, feats):
+        booster = model.get_booster()
+        try:
+            booster = booster[:model.best_iteration + 1]
+        except AttributeError:
+            pass
+        config = json.loads(booster.save_config())
+        # Newer releases write base_score as a vector, e.g. "[1.5E0]"
+        base_score = float(config["learner"]["learner_model_param"]["base_score"].strip("[]"))
+        column = {name: i for i, name in enumerate(feats)}
+
+        table = _TableBuilder()
+
+        def add(node, depth):
+            i = table.node()
+            table.depth = max(table.depth, depth)
+            if "leaf" in node:
+                table.value[i] = node["leaf"]
+                return i, node.get("cover", 1.0)
+            children = {child["nodeid"]: child for child in node["children"]}
+            left, left_cover = add(children[node["yes"]], depth + 1)
+            right, right_cover = add(children[node["no"]], depth + 1)
+            name = node["split"]
+            feature = column[name] if name in column else int(name.lstrip("f"))
+            table.split(i, feature, np.float32(node["split_condition"]), left, right,
+                        node.get("missing") == node["yes"])
+            cover = left_cover + right_cover
+            table.value[i] = (table.value[left] * left_cover + table.value[right] * right_cover) / cover \
+                if cover > 0 else (table.value[left] + table.value[right]) / 2
+            return i, cover
+
+        for dump in booster.get_dump(dump_format="json", with_stats=True):
+            table.roots.append(add(json.loads(dump), 0)[0])
+        return table.build(1.0, base_score, True, len(feats))
+
+    @staticmethod
+    def _catboost(model, n_features):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "model.json")
+            model.save_model(path, format="json")
+            with open(path) as f:
+                exported = json.load(f)
+
+        scale, bias = exported.get("scale_and_bias", [1.0, [0.0]])
+        bias = bias[0] if isinstance(bias, list) else bias
+        table = _TableBuilder()
+
+        # Symmetric trees: split ``level`` applies at that depth and sets bit
+        # ``level`` of the leaf index when x > border. Missing values are
+        # treated as the minimum (CatBoost's default), so they go left.
+        def add(splits, leaves, weights, level, index):
+            i = table.node()
+            if level == len(splits):
+                table.value[i] = leaves[index]
+                return i, weights[index]
+            left, left_weight = add(splits, leaves, weights, level + 1, index)
+            right, right_weight = add(splits, leaves, weights, level + 1, index | (1 << level))
+            split = splits[level]
+            table.split(i, split["float_feature_index"], np.float32(split["border"]), left, right, True)
+            weight = left_weight + right_weight
+            table.value[i] = (table.value[left] * left_weight + table.value[right] * right_weight) / weight \
+                if weight > 0 else (table.value[left] + table.value[right]) / 2
+            return i, weight
+
+        for tree in exported["oblivious_trees"]:
+            splits = tree["splits"]
+            leaves = tree["leaf_values"]
+            weights = tree.get("leaf_weights") or [1.0] * len(leaves)
+            table.roots.append(add(splits, leaves, weights, 0, 0)[0])
+            table.depth = max(table.depth, len(splits))
+        return table.build(scale, bias, False, n_features)
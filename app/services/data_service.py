@@ -1,27 +1,79 @@
-import requests
-from app.core.config import BASE_API_URL
+import hashlib
+from datetime import datetime, timezone
+
+from app.core.metrics import instrument
+from app.services.fdr_index import FDRIndex
+from app.services.snapshot_store import SnapshotStore
+
 
 class FPLDataService:
+    store = SnapshotStore()
+    fdr_index = FDRIndex()
+
     @staticmethod
-    def fetch_fpl_data():
-        res = requests.get(BASE_API_URL + "bootstrap-static/")
-        res.raise_for_status()
-        data = res.json()
+    @instrument("fetch_fpl_data")
+    def fetch_snapshot(force=False):
+        """Return players, teams, fixtures, next gameweek and a snapshot version.
+
+        The version changes whenever either upstream payload changes.
+        """
+        bootstrap = FPLDataService.store.get_entry("bootstrap-static/", force)
+        fixtures = FPLDataService.store.get_entry("fixtures/", force)
+        data = bootstrap["data"]
 
         players = data["elements"]
         teams = data["teams"]
-        fixtures = requests.get(BASE_API_URL + "fixtures/").json()
         events = data["events"]
         next_gw = next((e for e in events if not e["finished"]), None)
         next_gw_num = next_gw["id"] if next_gw else None
 
-        return players, teams, fixtures, next_gw_num
+        version = hashlib.sha256(
+            f"{bootstrap['digest']}:{fixtures['digest']}:{next_gw_num}".encode()
+        ).hexdigest()[:16]
+        return players, teams, fixtures["data"], next_gw_num, version
+
+    @staticmethod
+    def fetch_events():
+        return FPLDataService.store.get("bootstrap-static/")["events"]
+
+    @staticmethod
+    def deadline(events, gw):
+        """Deadline of gameweek ``gw`` as an aware datetime, or None when unknown."""
+        event = next((e for e in events if e.get("id") == gw), None)
+        return FPLDataService.parse_time(event.get("deadline_time")) if event else None
 
     @staticmethod
+    def parse_time(value):
+        """Aware datetime from an API timestamp such as ``deadline_time``, or None."""
+        if not value:
+            return None
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed
+
+    @staticmethod
+    @instrument("fetch_json")
+    def fetch_json(endpoint):
+        """Uncached API payload, e.g. ``event/{gw}/live/`` or ``element-summary/{id}/``."""
+        return FPLDataService.store.fetch(endpoint)
+
+    @staticmethod
+    @instrument("get_team_fdr")
     def get_team_fdr(fixtures):
-        fdr = {}
-        for f in fixtures:
-            if not f["finished"]:
-                fdr.setdefault(f["team_h"], []).append(f["team_h_difficulty"])
-                fdr.setdefault(f["team_a"], []).append(f["team_a_difficulty"])
-        return {tid: sum(vals)/len(vals) for tid, vals in fdr.items() if vals}
+        """{team_id: mean difficulty of its unfinished fixtures}.
+
+        Goes through the shared FDRIndex, which only re-applies fixtures that
+        changed since the previous call.
+        """
+        FPLDataService.fdr_index.update(fixtures)
+        return FPLDataService.fdr_index.remaining_mean()
+
+    @staticmethod
+    def get_fdr_index(fixtures):
+        """Snapshot copy of the team x gameweek FDR index for ``fixtures``."""
+        FPLDataService.fdr_index.update(fixtures)
+        return FPLDataService.fdr_index.copy()
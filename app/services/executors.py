@@ -0,0 +1,73 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from app.core.config import CPU_POOL_WORKERS, BATCH_SOLVER_WORKERS
+from app.core.metrics import observe_stage, timed
+from app.services.ml_service import MLService
+
+_pool = None
+_solver_pool = None
+_pool_lock = threading.Lock()
+
+
+def cpu_pool():
+    """Bounded process pool for CPU-heavy work, created on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=CPU_POOL_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def solver_pool():
+    """Process pool for batch squad solves, one worker per core by default."""
+    global _solver_pool
+    if _solver_pool is None:
+        with _pool_lock:
+            if _solver_pool is None:
+                _solver_pool = ProcessPoolExecutor(max_workers=BATCH_SOLVER_WORKERS,
+                                                   mp_context=multiprocessing.get_context("spawn"))
+    return _solver_pool
+
+
+def shutdown():
+    global _pool, _solver_pool
+    with _pool_lock:
+        for pool in (_pool, _solver_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        _pool = _solver_pool = None
+
+
+async def run_in_thread(fn, *args, **kwargs):
+    """Run a blocking call in the default thread pool, keeping the caller's
+    context so request stage timings are still recorded."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, fn, *args, **kwargs))
+
+
+def _train(fit, args):
+    models = fit(*args)
+    return models, MLService.last_training_report
+
+
+def train_in_pool(fit, *args):
+    """Blocking ``fit(*args)`` training call executed in the process pool.
+
+    ``fit`` must be importable by name. Stage timings recorded in the worker
+    are replayed into this process.
+    """
+    with timed("train_models"):
+        models, report = cpu_pool().submit(_train, fit, args).result()
+    for item in report:
+        if not item.get("cached"):
+            observe_stage(f"train_models.{item['position']}.{item['model']}", item["seconds"])
+    MLService.last_training_report = report
+    return models
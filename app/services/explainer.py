@@ -0,0 +1,107 @@
+import numpy as np
+
+from app.core.lazy import lazy_import
+from app.core.metrics import instrument
+
+catboost = lazy_import("catboost")
+xgboost = lazy_import("xgboost")
+
+
+class FeatureContributions:
+    """Additive per-feature contributions to every player's expected points.
+
+    ``matrix`` has one row per PlayerTable row and one column per name in
+    ``names``: "base" (the model's average output), every model feature and
+    "role_bonus" (the MID/FWD set-piece bonus). A row sums to the player's
+    unrounded expected points.
+    """
+
+    def __init__(self, names, matrix, features):
+        self.names = names
+        self.matrix = matrix
+        self._column = {name: i for i, name in enumerate(names)}
+        # position -> feature names of its model
+        self._features = features
+
+    def player(self, row, position):
+        """{name: contribution} over the base, the position model's features and the role bonus."""
+        names = ["base"] + self._features.get(position, []) + ["role_bonus"]
+        return {name: round(float(self.matrix[row, self._column[name]]), 3) for name in names}
+
+    def summary(self, rows):
+        """Summed contributions over ``rows`` for every feature used by any model."""
+        totals = self.matrix[rows].sum(axis=0)
+        return {name: round(float(v), 3) for name, v in zip(self.names, totals)}
+
+
+class Explainer:
+    """Feature attributions for the selected position models.
+
+    Linear models use coefficient x (value - mean over the position's
+    players). XGBoost and CatBoost use their native tree SHAP outputs.
+    RandomForest has no native SHAP in scikit-learn, so it uses path
+    attributions (Saabas): each split's change in node value is credited to
+    the split feature, averaged over the trees. ModelCompiler exports carry
+    their own attributions (path attributions for every tree ensemble).
+    """
+
+    @staticmethod
+    def contributions(model, name, X):
+        """``(contributions, base)`` for the raw model output on ``X``: n x features and n."""
+        if hasattr(model, "contributions"):
+            return model.contributions(X)
+        if name == "Linear":
+            values = np.asarray(X, dtype=float)
+            mean = values.mean(axis=0)
+            contrib = (values - mean) * model.coef_
+            return contrib, np.full(len(values), model.intercept_ + mean @ model.coef_)
+        if name == "XGB":
+            out = model.get_booster().predict(xgboost.DMatrix(X), pred_contribs=True)
+            return out[:, :-1], out[:, -1]
+        if name == "CatBoost":
+            out = model.get_feature_importance(catboost.Pool(X), type="ShapValues")
+            return out[:, :-1], out[:, -1]
+        if name == "RandomForest":
+            return Explainer._forest_contributions(model, X)
+        raise ValueError(f"Unknown estimator '{name}'")
+
+    @staticmethod
+    def _forest_contributions(model, X):
+        # decision_path stacks every tree's nodes; credit[node, feature] is the
+        # change in value from the node's parent, credited to the parent's split feature
+        indicator, node_ptr = model.decision_path(X)
+        credit = np.zeros((node_ptr[-1], np.shape(X)[1]))
+        base = 0.0
+        for k, tree in enumerate(model.estimators_):
+            t = tree.tree_
+            values = t.value[:, 0, 0]
+            internal = np.nonzero(t.children_left >= 0)[0]
+            for children in (t.children_left[internal], t.children_right[internal]):
+                credit[node_ptr[k] + children, t.feature[internal]] = values[children] - values[internal]
+            base += values[0]
+        n_trees = len(model.estimators_)
+        contrib = np.asarray(indicator @ credit) / n_trees
+        return contrib, np.full(indicator.shape[0], base / n_trees)
+
+    @staticmethod
+    @instrument("explain")
+    def explain(models, inputs, n):
+        """FeatureContributions for prediction_inputs() covering ``n`` rows.
+
+        Contributions are scaled like the predictions, so availability,
+        discipline, minutes and blank gameweeks are reflected in every feature.
+        """
+        features = {pos: list(feats) for pos, (_, feats, _) in models.items()}
+        names = ["base"] + list(dict.fromkeys(f for feats in features.values() for f in feats)) + ["role_bonus"]
+        column = {name: i for i, name in enumerate(names)}
+        matrix = np.zeros((n, len(names)))
+
+        for pos, (mask, X, scale, offset) in inputs.items():
+            model, feats, model_name = models[pos]
+            contrib, base = Explainer.contributions(model, model_name, X)
+            rows = np.nonzero(mask)[0]
+            matrix[rows, 0] = base * scale
+            matrix[np.ix_(rows, [column[f] for f in feats])] = contrib * scale[:, None]
+            matrix[rows, -1] = offset
+
+        return FeatureContributions(names, matrix, features)
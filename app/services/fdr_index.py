@@ -0,0 +1,158 @@
+import threading
+
+import numpy as np
+
+from app.core.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+
+class FDRIndex:
+    """Team x gameweek fixture difficulty matrix.
+
+    ``total[team, gw]`` holds the summed difficulty and ``count[team, gw]`` the
+    number of fixtures, so blank gameweeks have a count of 0 and doubles 2.
+    Remaining-season sums cover every unfinished fixture, including ones
+    without a gameweek yet. ``update`` applies only the fixtures that changed
+    since the last call.
+    """
+    DEFAULT_DIFFICULTY = 3
+
+    def __init__(self, n_teams=20, n_gameweeks=38):
+        self.total = np.zeros((n_teams + 1, n_gameweeks + 1), dtype=np.float32)
+        self.count = np.zeros((n_teams + 1, n_gameweeks + 1), dtype=np.int16)
+        self.remaining_total = np.zeros(n_teams + 1, dtype=np.float32)
+        self.remaining_count = np.zeros(n_teams + 1, dtype=np.int16)
+        self._fixtures = {}
+        self._source = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_fixtures(fixtures):
+        index = FDRIndex()
+        index.update(fixtures)
+        return index
+
+    # ------------------ Updates ------------------ #
+    @staticmethod
+    def _key(f):
+        return (f.get("event"), f["team_h"], f["team_a"], f["team_h_difficulty"], f["team_a_difficulty"],
+                bool(f.get("finished")))
+
+    def _grow(self, team, gw):
+        teams, gws = self.total.shape
+        if team < teams and (gw is None or gw < gws):
+            return
+        new_teams = max(teams, team + 1)
+        new_gws = max(gws, (gw or 0) + 1)
+        for name in ("total", "count"):
+            old = getattr(self, name)
+            grown = np.zeros((new_teams, new_gws), dtype=old.dtype)
+            grown[:teams, :gws] = old
+            setattr(self, name, grown)
+        for name in ("remaining_total", "remaining_count"):
+            old = getattr(self, name)
+            grown = np.zeros(new_teams, dtype=old.dtype)
+            grown[:teams] = old
+            setattr(self, name, grown)
+
+    def _apply(self, key, sign):
+        gw, team_h, team_a, diff_h, diff_a, finished = key
+        for team, diff in ((team_h, diff_h), (team_a, diff_a)):
+            self._grow(team, gw)
+            if gw is not None:
+                self.total[team, gw] += sign * diff
+                self.count[team, gw] += sign
+            if not finished:
+                self.remaining_total[team] += sign * diff
+                self.remaining_count[team] += sign
+
+    def update(self, fixtures):
+        """Apply added, rescheduled, re-rated, finished and removed fixtures.
+
+        Returns the number of fixtures that changed; passing the same list
+        object again is a no-op.
+        """
+        with self._lock:
+            if fixtures is self._source:
+                return 0
+            seen = set()
+            changed = 0
+            for f in fixtures:
+                fid = f["id"]
+                seen.add(fid)
+                key = self._key(f)
+                old = self._fixtures.get(fid)
+                if old == key:
+                    continue
+                if old is not None:
+                    self._apply(old, -1)
+                self._apply(key, 1)
+                self._fixtures[fid] = key
+                changed += 1
+            for fid in [fid for fid in self._fixtures if fid not in seen]:
+                self._apply(self._fixtures.pop(fid), -1)
+                changed += 1
+            self._source = fixtures
+            return changed
+
+    def copy(self):
+        """Immutable-by-convention copy for a snapshot."""
+        with self._lock:
+            index = FDRIndex(0, 0)
+            index.total = self.total.copy()
+            index.count = self.count.copy()
+            index.remaining_total = self.remaining_total.copy()
+            index.remaining_count = self.remaining_count.copy()
+            index._fixtures = dict(self._fixtures)
+            index._source = self._source
+            return index
+
+    # ------------------ Queries ------------------ #
+    def _slice(self, start_gw, length):
+        end = start_gw + length
+        total = np.zeros((self.total.shape[0], length), dtype=np.float32)
+        count = np.zeros((self.total.shape[0], length), dtype=np.int16)
+        available = max(0, min(end, self.total.shape[1]) - start_gw)
+        total[:, :available] = self.total[:, start_gw:start_gw + available]
+        count[:, :available] = self.count[:, start_gw:start_gw + available]
+        return total, count
+
+    def window(self, start_gw, length):
+        """Mean difficulty per team over gameweeks [start_gw, start_gw + length).
+
+        Indexed by team id; teams without fixtures in the window get the default.
+        """
+        total, count = self._slice(start_gw, length)
+        total, count = total.sum(axis=1), count.sum(axis=1)
+        out = np.full(len(total), self.DEFAULT_DIFFICULTY, dtype=np.float32)
+        np.divide(total, count, out=out, where=count > 0)
+        return out
+
+    def fixture_counts(self, start_gw, length=1):
+        """Fixtures per team (rows) and gameweek (columns) in the window."""
+        return self._slice(start_gw, length)[1]
+
+    def multipliers(self, start_gw, length):
+        """Per team and gameweek sum over fixtures of (6 - difficulty) / 3.
+
+        A difficulty-3 single fixture is 1.0, blanks are 0 and doubles add up.
+        """
+        total, count = self._slice(start_gw, length)
+        return (6 * count - total) / 3
+
+    def remaining_mean(self):
+        """{team_id: mean difficulty of its unfinished fixtures} as get_team_fdr returns it."""
+        return {
+            int(team): float(self.remaining_total[team] / self.remaining_count[team])
+            for team in np.nonzero(self.remaining_count > 0)[0]
+        }
+
+    def gameweek_frame(self):
+        """Long frame of (team_id, gw, fdr) for every team-gameweek with fixtures."""
+        teams, gws = np.nonzero(self.count > 0)
+        return pd.DataFrame({
+            "team_id": teams.astype(np.int16),
+            "gw": gws.astype(np.int16),
+            "fdr": (self.total[teams, gws] / self.count[teams, gws]).astype(np.float32),
+        })
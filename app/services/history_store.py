@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.core.config import HISTORY_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class ColumnTable:
+    """Append-only columnar table with one block of rows per gameweek.
+
+    Each column is a raw little-endian ``.bin`` file read through
+    ``np.memmap``; ``index.json`` maps gameweek -> [start, end) row range.
+    Rows within a block are sorted by player id, so a player's value for a
+    gameweek is a binary search in that block. Replacing a block with the
+    same players overwrites its values in place; otherwise the new block is
+    appended and the live blocks are compacted into a new generation of
+    column files, which the index switches to atomically. Files of the
+    previous generation are kept for readers still holding the old index.
+    """
+
+    def __init__(self, directory, columns):
+        self.directory = directory
+        self.columns = {name: np.dtype(dtype) for name, dtype in columns.items()}
+        self._lock = threading.Lock()
+        self._index = self._load_index()
+        self._maps = None
+
+    # ------------------ Index ------------------ #
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.directory, "index.json")) as f:
+                index = json.load(f)
+            return {"rows": index["rows"], "generation": index.get("generation", 0),
+                    "blocks": {int(gw): tuple(r) for gw, r in index["blocks"].items()}}
+        except (OSError, ValueError, KeyError):
+            return {"rows": 0, "generation": 0, "blocks": {}}
+
+    def _save_index(self, index):
+        path = os.path.join(self.directory, "index.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"rows": index["rows"], "generation": index["generation"],
+                       "blocks": {str(gw): list(r) for gw, r in index["blocks"].items()}}, f)
+        os.replace(path + ".tmp", path)
+
+    def _path(self, name, generation):
+        suffix = f".{generation}" if generation else ""
+        return os.path.join(self.directory, f"{name}{suffix}.bin")
+
+    @property
+    def rows(self):
+        return self._index["rows"]
+
+    def gameweeks(self):
+        return sorted(self._index["blocks"])
+
+    def has(self, gw):
+        return gw in self._index["blocks"]
+
+    # ------------------ Writes ------------------ #
+    def write_block(self, gw, data, replace=False):
+        """Store the rows for ``gw``; ``data`` maps every column to an array."""
+        with self._lock:
+            index = self._index
+            old = index["blocks"].get(gw)
+            if old is not None and not replace:
+                return False
+
+            order = np.argsort(np.asarray(data["player_id"]), kind="stable")
+            values = {name: np.asarray(data[name])[order].astype(dtype) for name, dtype in self.columns.items()}
+            generation = index["generation"]
+            if old is not None and np.array_equal(self._columns(index)["player_id"][old[0]:old[1]],
+                                                  values["player_id"]):
+                # Same players: overwrite the block where it is
+                for name, dtype in self.columns.items():
+                    with open(self._path(name, generation), "r+b") as f:
+                        f.seek(old[0] * dtype.itemsize)
+                        f.write(values[name].tobytes())
+                return True
+
+            n = len(order)
+            start = index["rows"]
+            os.makedirs(self.directory, exist_ok=True)
+            for name, dtype in self.columns.items():
+                with open(self._path(name, generation), "a+b") as f:
+                    # Drop bytes from an interrupted write that never reached the index
+                    f.truncate(start * dtype.itemsize)
+                    f.write(values[name].tobytes())
+
+            blocks = dict(index["blocks"])
+            blocks[gw] = (start, start + n)
+            new_index = {"rows": start + n, "generation": generation, "blocks": blocks}
+            if old is not None:
+                new_index = self._compact(new_index)
+            self._save_index(new_index)
+            self._index = new_index
+            self._maps = None
+            if new_index["generation"] != generation:
+                self._remove_generation(generation - 1)
+            return True
+
+    def _compact(self, index):
+        """Copy the live blocks of ``index`` into the next generation's files; returns its index."""
+        cols = self._columns(index)
+        generation = index["generation"] + 1
+        blocks, rows = {}, 0
+        for gw in sorted(index["blocks"]):
+            start, end = index["blocks"][gw]
+            blocks[gw] = (rows, rows + end - start)
+            rows += end - start
+        for name in self.columns:
+            with open(self._path(name, generation), "wb") as f:
+                for gw in sorted(index["blocks"]):
+                    start, end = index["blocks"][gw]
+                    f.write(np.asarray(cols[name][start:end]).tobytes())
+        return {"rows": rows, "generation": generation, "blocks": blocks}
+
+    def _remove_generation(self, generation):
+        if generation < 0:
+            return
+        for name in self.columns:
+            try:
+                os.remove(self._path(name, generation))
+            except OSError:
+                pass
+
+    # ------------------ Reads ------------------ #
+    def _columns(self, index=None):
+        index = index or self._index
+        key = (index["generation"], index["rows"])
+        maps = self._maps
+        if maps is None or maps[0] != key:
+            cols = {}
+            for name, dtype in self.columns.items():
+                if index["rows"]:
+                    cols[name] = np.memmap(self._path(name, index["generation"]), dtype=dtype,
+                                           mode="r", shape=(index["rows"],))
+                else:
+                    cols[name] = np.empty(0, dtype=dtype)
+            maps = self._maps = (key, cols)
+        return maps[1]
+
+    def block(self, gw, columns=None):
+        """Column slices for one gameweek, or None when it is not stored."""
+        index = self._index
+        rng = index["blocks"].get(gw)
+        if rng is None:
+            return None
+        cols = self._columns(index)
+        return {name: cols[name][rng[0]:rng[1]] for name in (columns or self.columns)}
+
+    def lookup(self, player_id, gws, columns=None):
+        """Per-gameweek values for one player: {gw: {column: value}}."""
+        index = self._index
+        cols = self._columns(index)
+        result = {}
+        for gw in gws:
+            rng = index["blocks"].get(gw)
+            if rng is None:
+                continue
+            ids = cols["player_id"][rng[0]:rng[1]]
+            j = int(np.searchsorted(ids, player_id))
+            if j < len(ids) and ids[j] == player_id:
+                row = rng[0] + j
+                result[gw] = {name: cols[name][row].item() for name in (columns or self.columns)}
+        return result
+
+    def scan(self, gw_from=None, gw_to=None, columns=None):
+        """Yield (gw, columns) blocks in gameweek order within [gw_from, gw_to]."""
+        for gw in self.gameweeks():
+            if (gw_from is not None and gw < gw_from) or (gw_to is not None and gw > gw_to):
+                continue
+            yield gw, self.block(gw, columns)
+
+
+class HistoryStore:
+    """Per-gameweek player actuals and the predictions we served for them.
+
+    Actuals are ingested from ``event/{gw}/live`` once a gameweek is
+    finished, with ``element-summary`` histories as the fallback;
+    predictions are recorded for the upcoming gameweek each time a
+    snapshot is built, up to the gameweek's deadline.
+    """
+    ACTUAL_COLUMNS = {
+        "player_id": "<i4", "fixtures": "<i1", "total_points": "<i2", "minutes": "<i2",
+        "goals_scored": "<i2", "assists": "<i2", "clean_sheets": "<i2", "goals_conceded": "<i2",
+        "saves": "<i2", "penalties_saved": "<i2", "yellow_cards": "<i2", "red_cards": "<i2",
+        "bonus": "<i2", "bps": "<i2", "influence": "<f4", "creativity": "<f4", "threat": "<f4",
+        "ict_index": "<f4",
+    }
+    PREDICTION_COLUMNS = {"player_id": "<i4", "predicted": "<f4"}
+
+    def __init__(self, directory=HISTORY_DIR):
+        self.actuals = ColumnTable(os.path.join(directory, "actuals"), HistoryStore.ACTUAL_COLUMNS)
+        self.predictions = ColumnTable(os.path.join(directory, "predictions"), HistoryStore.PREDICTION_COLUMNS)
+
+    # ------------------ Ingestion ------------------ #
+    @staticmethod
+    def _stat_rows(rows):
+        data = {name: [] for name in HistoryStore.ACTUAL_COLUMNS}
+        for row in rows:
+            for name in HistoryStore.ACTUAL_COLUMNS:
+                data[name].append(float(row.get(name) or 0))
+        return data
+
+    def ingest_live(self, gw, payload):
+        """Store a finished gameweek from its ``event/{gw}/live`` payload."""
+        rows = []
+        for element in payload.get("elements", []):
+            rows.append({**element["stats"], "player_id": element["id"], "fixtures": len(element.get("explain", []))})
+        return self.actuals.write_block(gw, self._stat_rows(rows))
+
+    def ingest_element_summaries(self, payloads, gameweeks=None):
+        """Store gameweeks missing from the store from ``element-summary`` payloads.
+
+        ``payloads`` maps player id -> payload; double gameweeks are summed.
+        Only ``gameweeks`` are considered when given.
+        """
+        by_gw = {}
+        for player_id, payload in payloads.items():
+            for match in payload.get("history", []):
+                gw = match["round"]
+                if gameweeks is not None and gw not in gameweeks:
+                    continue
+                row = by_gw.setdefault(gw, {}).setdefault(player_id, {"player_id": player_id, "fixtures": 0})
+                row["fixtures"] += 1
+                for name in HistoryStore.ACTUAL_COLUMNS:
+                    if name not in ("player_id", "fixtures"):
+                        row[name] = row.get(name, 0) + float(match.get(name) or 0)
+
+        written = []
+        for gw in sorted(by_gw):
+            if self.actuals.write_block(gw, self._stat_rows(by_gw[gw].values())):
+                written.append(gw)
+        return written
+
+    def record_predictions(self, gw, player_ids, predicted, deadline=None, now=None):
+        """Store the latest predictions for an upcoming gameweek.
+
+        Predictions are frozen at the gameweek's ``deadline`` (an aware
+        datetime), so later snapshots built from in-play data never replace
+        the ones that were served before it.
+        """
+        now = now or datetime.now(timezone.utc)
+        if gw is None or self.actuals.has(gw) or (deadline is not None and now >= deadline):
+            return False
+        return self.predictions.write_block(gw, {"player_id": player_ids, "predicted": predicted}, replace=True)
+
+    def sync(self, events, fetch, player_ids=()):
+        """Ingest every finished gameweek not stored yet; ``fetch(endpoint)`` returns JSON.
+
+        Gameweeks whose ``event/{gw}/live`` payload fails or lists no players
+        are backfilled from the ``element-summary`` histories of ``player_ids``.
+        """
+        added, missing = [], []
+        for event in events:
+            gw = event["id"]
+            if event.get("finished") and event.get("data_checked", True) and not self.actuals.has(gw):
+                try:
+                    payload = fetch(f"event/{gw}/live/")
+                except Exception:
+                    logger.warning("Could not fetch live data for gameweek %s", gw, exc_info=True)
+                    payload = None
+                if payload and payload.get("elements"):
+                    self.ingest_live(gw, payload)
+                    added.append(gw)
+                else:
+                    missing.append(gw)
+
+        if missing and player_ids:
+            payloads = {}
+            for player_id in player_ids:
+                try:
+                    payloads[player_id] = fetch(f"element-summary/{player_id}/")
+                except Exception:
+                    logger.warning("Could not fetch element-summary for player %s", player_id, exc_info=True)
+            added += self.ingest_element_summaries(payloads, set(missing))
+        if added:
+            logger.info("History store ingested gameweeks %s", sorted(added))
+        return added
+
+    # ------------------ Queries ------------------ #
+    def player_trends(self, player_id, gws):
+        actual = self.actuals.lookup(player_id, gws, ["total_points", "minutes"])
+        predicted = self.predictions.lookup(player_id, gws, ["predicted"])
+        return [
+            {
+                "gw": gw,
+                "actual_points": actual[gw]["total_points"] if gw in actual else None,
+                "minutes": actual[gw]["minutes"] if gw in actual else None,
+                "predicted_points": round(predicted[gw]["predicted"], 2) if gw in predicted else None,
+            }
+            for gw in gws
+        ]
+
+
+history = HistoryStore()
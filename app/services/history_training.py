@@ -0,0 +1,237 @@
+import glob
+
+import numpy as np
+
+from app.core.config import (
+    POSITIONS, HISTORY_CSV_PATHS, HISTORY_CSV_CHUNKSIZE, HISTORY_MIN_GAMEWEEKS, HISTORY_TRAINING
+)
+from app.core.lazy import lazy_import
+from app.core.metrics import instrument
+from app.services.fdr_index import FDRIndex
+from app.services.history_store import HistoryStore
+from app.services.ml_service import MLService
+
+pd = lazy_import("pandas")
+
+# Rolling-mean windows in gameweeks; module level so the class body's
+# comprehensions can see them
+ROLLING_WINDOWS = (3, 5)
+
+
+class GameweekTrainer:
+    """Position models trained on one row per player-gameweek.
+
+    Rows come from past-season CSV exports (``merged_gw.csv`` layout, read in
+    chunks) and the current season's HistoryStore. Each row's features are
+    rolling means of the player's previous gameweeks within the season plus
+    the fixture difficulty of that gameweek; the target is the points scored.
+    """
+    STATS = ["total_points", "minutes", "goals_scored", "assists", "clean_sheets", "goals_conceded",
+             "saves", "bonus", "bps", "ict_index"]
+    ROLLING = ["total_points", "minutes", "goals_scored", "assists", "clean_sheets", "bonus", "ict_index"]
+    WINDOWS = ROLLING_WINDOWS
+    FEATURES = [f"{stat}_last{w}" for stat in ROLLING for w in ROLLING_WINDOWS] + ["starts_last5", "fixtures", "fdr"]
+
+    STAT_DTYPES = {stat: "float32" for stat in STATS}
+    CSV_COLUMNS = {"element": "player_id", "GW": "gw", "round": "gw", "position": "position",
+                   "team": "team", "opponent_team": "opponent_team", **{stat: stat for stat in STATS}}
+    CSV_POSITIONS = {"GK": "GK", "GKP": "GK", "DEF": "DEF", "MID": "MID", "FWD": "FWD"}
+
+    # ------------------ Loading ------------------ #
+    @staticmethod
+    def csv_paths(patterns=HISTORY_CSV_PATHS):
+        return sorted(path for pattern in patterns for path in glob.glob(pattern))
+
+    @staticmethod
+    def load_csv(path, season, chunksize=HISTORY_CSV_CHUNKSIZE):
+        """One past season, aggregated to a row per player-gameweek with compact dtypes.
+
+        Past seasons have no fixture list to look difficulty up in, so each
+        fixture's ``fdr`` is derived from the CSV itself: opponents are ranked
+        by the points players scored against them over the season and mapped
+        onto the 1 (easiest) to 5 (hardest) scale. Rows without an opponent
+        column fall back to the neutral 3.
+        """
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [c for c in GameweekTrainer.CSV_COLUMNS if c in header]
+        dtypes = {c: GameweekTrainer.STAT_DTYPES.get(GameweekTrainer.CSV_COLUMNS[c], None) for c in usecols}
+        dtypes = {c: d for c, d in dtypes.items() if d}
+
+        parts, fixtures = [], []
+        for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+            chunk = chunk.rename(columns=GameweekTrainer.CSV_COLUMNS)
+            chunk = chunk.loc[:, ~chunk.columns.duplicated()]
+            for stat in GameweekTrainer.STATS:
+                if stat not in chunk.columns:
+                    chunk[stat] = np.float32(0)
+            chunk["fixtures"] = np.int8(1)
+            if "opponent_team" in chunk.columns:
+                fixtures.append(chunk[["player_id", "gw", "opponent_team", "total_points"]]
+                                .astype({"player_id": "int32", "gw": "int16", "opponent_team": "int16"}))
+            keys = ["player_id", "gw"] + [c for c in ("position", "team") if c in chunk.columns]
+            parts.append(chunk.groupby(keys, sort=False, observed=True)[GameweekTrainer.STATS + ["fixtures"]].sum())
+
+        # Double gameweeks can straddle chunk boundaries, so aggregate once more
+        df = pd.concat(parts).groupby(level=list(range(parts[0].index.nlevels)), sort=False).sum().reset_index()
+        df["season"] = np.int16(season)
+        df["position"] = df.get("position", pd.Series("UNK", index=df.index)).map(GameweekTrainer.CSV_POSITIONS)
+        df["team_id"] = np.int16(-1)
+        if fixtures:
+            df = df.merge(GameweekTrainer._csv_difficulty(pd.concat(fixtures, ignore_index=True)),
+                          on=["player_id", "gw"], how="left")
+        else:
+            df["fdr"] = np.nan
+        return GameweekTrainer._compact(df.drop(columns=["team"], errors="ignore"))
+
+    @staticmethod
+    def _csv_difficulty(fixtures):
+        """Mean fixture difficulty per (player_id, gw) from one season's per-fixture rows."""
+        conceded = fixtures.groupby("opponent_team")["total_points"].mean()
+        # Most points conceded -> 1, fewest -> 5
+        rank = conceded.rank(method="average", pct=True)
+        difficulty = (5 - 4 * (rank - rank.min()) / max(rank.max() - rank.min(), 1e-9)).astype("float32")
+        fixtures = fixtures.assign(fdr=fixtures["opponent_team"].map(difficulty))
+        return fixtures.groupby(["player_id", "gw"], sort=False)["fdr"].mean().reset_index()
+
+    @staticmethod
+    def load_store(store, players, season):
+        """The current season from the history store, with positions and teams from bootstrap."""
+        blocks = [(gw, cols) for gw, cols in store.actuals.scan(columns=["player_id", "fixtures"] + GameweekTrainer.STATS)]
+        if not blocks:
+            return GameweekTrainer._compact(pd.DataFrame(columns=["season", "player_id", "gw", "position", "team_id",
+                                                                 "fixtures", "fdr"] + GameweekTrainer.STATS))
+        df = pd.DataFrame({
+            name: np.concatenate([np.asarray(cols[name]) for _, cols in blocks])
+            for name in ["player_id", "fixtures"] + GameweekTrainer.STATS
+        })
+        df["gw"] = np.concatenate([np.full(len(cols["player_id"]), gw, dtype="int16") for gw, cols in blocks])
+        df["season"] = np.int16(season)
+        info = {p["id"]: (POSITIONS.get(p["element_type"], "UNK"), p["team"]) for p in players}
+        df["position"] = df["player_id"].map(lambda pid: info.get(pid, ("UNK", -1))[0])
+        df["team_id"] = df["player_id"].map(lambda pid: info.get(pid, ("UNK", -1))[1])
+        df["fdr"] = np.nan
+        return GameweekTrainer._compact(df)
+
+    @staticmethod
+    def _compact(df):
+        df = df.astype({"season": "int16", "player_id": "int32", "gw": "int16", "team_id": "int16",
+                        "fixtures": "int8", "fdr": "float32", **GameweekTrainer.STAT_DTYPES})
+        df["position"] = df["position"].astype(pd.CategoricalDtype(list(POSITIONS.values()) + ["UNK"]))
+        return df
+
+    @staticmethod
+    def available(store):
+        """Whether there is enough per-gameweek history to train on and predict from.
+
+        Past-season CSVs only add training rows; predictions are built from the
+        current season's rolling features, so at least HISTORY_MIN_GAMEWEEKS
+        stored gameweeks are always required.
+        """
+        if not HISTORY_TRAINING:
+            return False
+        return len(store.actuals.gameweeks()) >= HISTORY_MIN_GAMEWEEKS
+
+    @staticmethod
+    def trained(models):
+        """Whether ``models`` were produced by train() rather than MLService.train_models."""
+        return any(feats == GameweekTrainer.FEATURES for _, feats, _ in models.values())
+
+    # ------------------ Features ------------------ #
+    @staticmethod
+    def add_features(df, difficulty):
+        """Rolling means over each player's previous gameweeks in the season.
+
+        Uses grouped cumulative sums, so there is no per-player Python loop.
+        ``difficulty`` is FDRIndex.gameweek_frame(); it fills ``fdr`` for rows
+        that do not carry their own (the current season).
+        """
+        df = df.sort_values(["season", "player_id", "gw"], kind="stable").reset_index(drop=True)
+        keys = [df["season"], df["player_id"]]
+        grouped = df.groupby(keys, sort=False)
+        prior = grouped.cumcount().to_numpy()
+
+        def rolling_mean(values, window):
+            # Sum of the previous `window` rows = exclusive cumsum minus its value `window` rows back
+            exclusive = values.groupby(keys, sort=False).cumsum() - values
+            lagged = exclusive.groupby(keys, sort=False).shift(window).fillna(0)
+            count = np.minimum(prior, window)
+            out = np.zeros(len(df), dtype="float32")
+            np.divide((exclusive - lagged).to_numpy(dtype="float32"), count, out=out, where=count > 0)
+            return out
+
+        for stat in GameweekTrainer.ROLLING:
+            values = df[stat].astype("float32")
+            for window in GameweekTrainer.WINDOWS:
+                df[f"{stat}_last{window}"] = rolling_mean(values, window)
+        df["starts_last5"] = rolling_mean((df["minutes"] >= 60).astype("float32"), 5)
+
+        df["prior"] = prior.astype("int16")
+        df = df.merge(difficulty, on=["team_id", "gw"], how="left", suffixes=("", "_fixture"))
+        df["fdr"] = df["fdr"].fillna(df.pop("fdr_fixture")).fillna(3).astype("float32")
+        return df
+
+    # ------------------ Training ------------------ #
+    @staticmethod
+    @instrument("train_gameweek_models")
+    def train(csv_paths, history_dir, players, fixtures, workers=None, cpu_budget=None):
+        """Load all seasons and fit the position models; safe to run in a worker process."""
+        frames = [GameweekTrainer.load_csv(path, season) for season, path in enumerate(csv_paths)]
+        frames.append(GameweekTrainer.load_store(HistoryStore(history_dir), players, len(csv_paths)))
+        df = pd.concat(frames, ignore_index=True)
+        df = GameweekTrainer.add_features(df, FDRIndex.from_fixtures(fixtures).gameweek_frame())
+        df = df[df["prior"] > 0]
+
+        feats = GameweekTrainer.FEATURES
+        datasets = {}
+        for pos in POSITIONS.values():
+            dpos = df[df["position"] == pos]
+            if len(dpos) < 5:
+                continue
+            datasets[pos] = (dpos[feats], dpos["total_points"], feats)
+        return MLService.select_models(datasets, workers, cpu_budget)
+
+    # ------------------ Prediction ------------------ #
+    @staticmethod
+    def prediction_inputs(models, store, players, fdr_index, next_gw, season):
+        """Per-position ``{pos: (mask, X, scale, offset)}`` as MLService.prediction_inputs.
+
+        ``scale`` applies the availability rule and zeroes blank gameweeks.
+        """
+        inputs = {}
+        if next_gw is None or not players:
+            return inputs
+
+        history = GameweekTrainer.load_store(store, players, season)
+        difficulty = fdr_index.gameweek_frame()
+        fixture_counts = fdr_index.fixture_counts(next_gw)[:, 0]
+
+        upcoming = pd.DataFrame({
+            "season": season,
+            "player_id": [p["id"] for p in players],
+            "gw": next_gw,
+            "position": [POSITIONS.get(p["element_type"], "UNK") for p in players],
+            "team_id": [p["team"] for p in players],
+            "fixtures": [fixture_counts[p["team"]] if p["team"] < len(fixture_counts) else 0 for p in players],
+            "fdr": np.nan,
+            **{stat: 0.0 for stat in GameweekTrainer.STATS},
+        })
+        df = GameweekTrainer.add_features(pd.concat([history, GameweekTrainer._compact(upcoming)], ignore_index=True),
+                                          difficulty)
+        df = df[df["gw"] == next_gw].set_index("player_id")
+
+        # Same availability handling as MLService.predict_points; blank gameweeks score nothing
+        chance = np.array([p.get("chance_of_playing_next_round", 100) or 100 for p in players], dtype=float)
+        ids = np.array([p["id"] for p in players])
+        scale = np.where(chance < 50, 0, chance / 100) * (df.loc[ids, "fixtures"].to_numpy() > 0)
+
+        positions = np.array([POSITIONS.get(p["element_type"], "UNK") for p in players])
+        for pos, (model, feats, _) in models.items():
+            mask = positions == pos
+            if mask.any():
+                inputs[pos] = (mask, df.loc[ids[mask], feats], scale[mask], np.zeros(mask.sum()))
+        return inputs
+
+    @staticmethod
+    def predict_inputs(models, inputs, n):
+        """Expected points for prediction_inputs(), rounded and clipped at zero."""
+        return np.round(np.maximum(MLService.predict_inputs(models, inputs, n), 0), 2)
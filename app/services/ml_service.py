@@ -1,13 +1,43 @@
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from xgboost import XGBRegressor
-from catboost import CatBoostRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import numpy as np
+import logging
+import time
+
+from app.core.config import (
+    TRAIN_WORKERS, TRAIN_CPU_BUDGET, SELECTION_BUDGET, SELECTION_FOLDS, EARLY_STOPPING_ROUNDS, MAX_BOOSTING_ROUNDS
+)
+from app.core.lazy import lazy_import
+from app.core.metrics import instrument, observe_stage
+from app.services.model_selection import Candidate, PositionSearch, SelectionCache
+
+# Loaded on first use, so serving stored models never imports the unused libraries
+pd = lazy_import("pandas")
+joblib = lazy_import("joblib")
+catboost = lazy_import("catboost")
+xgboost = lazy_import("xgboost")
+sklearn_ensemble = lazy_import("sklearn.ensemble")
+sklearn_linear = lazy_import("sklearn.linear_model")
+sklearn_metrics = lazy_import("sklearn.metrics")
+sklearn_selection = lazy_import("sklearn.model_selection")
+
+logger = logging.getLogger(__name__)
 
 class MLService:
+    ESTIMATORS = ["Linear", "XGB", "RandomForest", "CatBoost"]
+    # Hyperparameter configurations per estimator; boosters also stop early
+    CANDIDATES = {
+        "Linear": [{}],
+        "XGB": [{"max_depth": 3, "learning_rate": 0.1}, {"max_depth": 5, "learning_rate": 0.05},
+                {"max_depth": 2, "learning_rate": 0.2}],
+        "RandomForest": [{"n_estimators": 100, "max_depth": 6},
+                         {"n_estimators": 200, "max_depth": 10, "min_samples_leaf": 3}],
+        "CatBoost": [{"depth": 5, "learning_rate": 0.1}, {"depth": 4, "learning_rate": 0.05}],
+    }
+    # Approximate single-thread seconds per training row, feature and unit of
+    # estimator size (trees x depth, or boosting rounds x depth); used to
+    # budget model selection without timing it
+    FIT_COST = {"Linear": 2e-8, "XGB": 2e-9, "RandomForest": 1e-9, "CatBoost": 3e-9}
+    last_training_report = []
+
     POSITION_FEATURES = {
         "GK": ["minutes", "saves", "clean_sheets", "goals_conceded", "penalties_saved",
                "yellow_cards", "red_cards", "form", "points_per_game", "fdr", "availability"],
@@ -26,22 +56,35 @@ class MLService:
     def evaluate_model(model, X_val, y_val):
         y_pred = model.predict(X_val)
         return {
-            "R2": r2_score(y_val, y_pred),
-            "RMSE": np.sqrt(mean_squared_error(y_val, y_pred)),
-            "MAE": mean_absolute_error(y_val, y_pred)
+            "R2": sklearn_metrics.r2_score(y_val, y_pred),
+            "RMSE": np.sqrt(sklearn_metrics.mean_squared_error(y_val, y_pred)),
+            "MAE": sklearn_metrics.mean_absolute_error(y_val, y_pred)
         }
 
     @staticmethod
     def compute_model_score(metrics):
-        # Higher is better
-        r2 = metrics["R2"]
-        rmse_score = 1 / (metrics["RMSE"] + 1e-6)  # avoid division by zero
-        mae_score = 1 / (metrics["MAE"] + 1e-6)
-        return (r2 + rmse_score + mae_score) / 3
+        # Higher is better. Cross-validated RMSE alone, in points; R2 and MAE
+        # are reported but mixing them with 1/RMSE compared different units
+        return -metrics["RMSE"]
+
+    @staticmethod
+    def estimate_fit_seconds(name, params, rows, features):
+        """Estimated seconds for one fit of a candidate on ``rows`` x ``features``."""
+        if name == "Linear":
+            size = features
+        elif name == "XGB":
+            size = MAX_BOOSTING_ROUNDS * params.get("max_depth", 6)
+        elif name == "RandomForest":
+            size = params.get("n_estimators", 100) * params.get("max_depth", 16)
+        else:
+            size = MAX_BOOSTING_ROUNDS * params.get("depth", 6)
+        return MLService.FIT_COST[name] * rows * features * size
 
     # ------------------ Model Training ------------------ #
     @staticmethod
-    def train_models(players, fdr_map):
+    @instrument("train_models")
+    def train_models(players, fdr_map, workers=None, cpu_budget=None):
+        """Select the best model per position on season totals, see select_models."""
         df = pd.DataFrame(players)
         df["fdr"] = df["team"].map(fdr_map).fillna(3)
         df["element_type"] = df["element_type"].map({1: "GK", 2: "DEF", 3: "MID", 4: "FWD"}).fillna("UNK")
@@ -63,50 +106,143 @@ class MLService:
         df["availability"] = df.get("chance_of_playing_next_round", 100).fillna(100) / 100
         df["y"] = df["total_points"] / (df["minutes"] / 90 + 0.01)
 
-        best_models = {}
-
+        datasets = {}
         for pos, feats in MLService.POSITION_FEATURES.items():
             dpos = df[df["element_type"] == pos]
             if len(dpos) < 5:
                 continue
+            datasets[pos] = (dpos[feats], dpos["y"], feats)
+
+        return MLService.select_models(datasets, workers, cpu_budget)
+
+    @staticmethod
+    def select_models(datasets, workers=None, cpu_budget=None, budget=None):
+        """Pick the best candidate for each position's ``(X, y, feats)``.
+
+        Every CANDIDATES configuration is scored by k-fold CV RMSE with
+        successive halving (see PositionSearch) under a per-position budget of
+        estimated fitting seconds (see estimate_fit_seconds); XGBoost and CatBoost stop early on each validation
+        fold. The winner is refitted on all rows. Positions whose features and
+        data match a previous run are served from SelectionCache.
+
+        With more than one worker the (candidate, fold) fits of a rung are run
+        in a loky process pool; each fit gets ``cpu_budget // workers``
+        threads so the pool does not oversubscribe the machine. Seeds are
+        fixed, so the selected models match a serial run. Per-candidate CV
+        results and fit times are kept in ``MLService.last_training_report``.
+        """
+        workers = max(1, workers or TRAIN_WORKERS)
+        threads = max(1, (cpu_budget or TRAIN_CPU_BUDGET) // workers)
+        budget = budget or SELECTION_BUDGET
+
+        best_models, report, searches = {}, [], []
+        for pos, (X, y, feats) in datasets.items():
+            key = SelectionCache.key(pos, feats, X, y, (MLService.CANDIDATES, SELECTION_FOLDS, MAX_BOOSTING_ROUNDS,
+                                                                budget))
+            cached = SelectionCache.load(key)
+            if cached is not None:
+                best_models[pos], entries = cached
+                report += [{**entry, "seconds": 0.0, "cached": True} for entry in entries]
+                logger.info("Reusing the selected %s model %s", pos, best_models[pos][2])
+                continue
+
+            folds = max(2, min(SELECTION_FOLDS, len(X) // 2))
+            splits = list(sklearn_selection.KFold(n_splits=folds, shuffle=True, random_state=42).split(X))
+            candidates = [Candidate(name, params) for name in MLService.ESTIMATORS
+                          for params in MLService.CANDIDATES[name]]
+            train_rows = len(X) * (folds - 1) // folds
+            searches.append(PositionSearch(
+                pos, X, y, feats, key, candidates, splits, budget, MLService.compute_model_score,
+                lambda c, rows=train_rows, n=len(feats): MLService.estimate_fit_seconds(c.name, c.params, rows, n)))
+
+        # One rung of every unfinished position per round, so positions share the pool
+        while any(not search.done for search in searches):
+            active = [search for search in searches if not search.done]
+            tasks = [(search, candidate, fold) for search in active for candidate, fold in search.tasks()]
+            results = MLService._run(workers, threads, [
+                (MLService._fit_fold, (c.name, c.params, search.X, search.y, search.splits[fold]))
+                for search, c, fold in tasks
+            ])
+            for (search, candidate, fold), (metrics, iterations, seconds) in zip(tasks, results):
+                search.record(candidate, metrics, iterations, seconds)
+            for search in active:
+                search.advance()
 
-            X = dpos[feats]
-            y = dpos["y"]
-            X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=42)
-
-            model_dict = {}
-            metric_dict = {}
-
-            # Linear Regression
-            lr = LinearRegression()
-            lr.fit(X_train, y_train)
-            model_dict["Linear"] = lr
-            metric_dict["Linear"] = MLService.evaluate_model(lr, X_val, y_val)
-
-            # XGBoost
-            xgb = XGBRegressor(n_estimators=120, max_depth=3, learning_rate=0.1, random_state=42)
-            xgb.fit(X_train, y_train)
-            model_dict["XGB"] = xgb
-            metric_dict["XGB"] = MLService.evaluate_model(xgb, X_val, y_val)
-
-            # RandomForest
-            rf = RandomForestRegressor(n_estimators=100, max_depth=6, random_state=42)
-            rf.fit(X_train, y_train)
-            model_dict["RandomForest"] = rf
-            metric_dict["RandomForest"] = MLService.evaluate_model(rf, X_val, y_val)
-
-            # CatBoost
-            cb = CatBoostRegressor(n_estimators=100, depth=5, learning_rate=0.1, verbose=0, random_state=42)
-            cb.fit(X_train, y_train)
-            model_dict["CatBoost"] = cb
-            metric_dict["CatBoost"] = MLService.evaluate_model(cb, X_val, y_val)
-
-            # Robust best model selection
-            best_model_name = max(metric_dict, key=lambda k: MLService.compute_model_score(metric_dict[k]))
-            best_models[pos] = (model_dict[best_model_name], feats, best_model_name)
+        winners = [search.winner() for search in searches]
+        refits = MLService._run(workers, threads, [
+            (MLService._refit, (w.name, w.params, search.X, search.y, w.n_estimators()))
+            for search, w in zip(searches, winners)
+        ])
+        for search, winner, (model, seconds) in zip(searches, winners, refits):
+            winner.seconds += seconds
+            best_models[search.position] = (model, search.feats, winner.name)
+            entries = search.report()
+            SelectionCache.save(search.key, best_models[search.position], entries)
+            report += entries
+            logger.info("Selected %s %s %s (CV RMSE %.3f over %d folds) in %.1fs of fitting",
+                        search.position, winner.name, winner.params, winner.metrics()["RMSE"],
+                        len(winner.folds), search.spent + seconds)
 
+        for item in report:
+            if not item["cached"]:
+                observe_stage(f"train_models.{item['position']}.{item['model']}", item["seconds"])
+        MLService.last_training_report = report
         return best_models
 
+    @staticmethod
+    def _run(workers, threads, calls):
+        """Results of ``fn(*args, threads)`` for each ``(fn, args)``, in order."""
+        if workers == 1 or len(calls) <= 1:
+            return [fn(*args, threads) for fn, args in calls]
+        with joblib.parallel_backend("loky", inner_max_num_threads=threads):
+            return joblib.Parallel(n_jobs=min(workers, len(calls)))(
+                joblib.delayed(fn)(*args, threads) for fn, args in calls
+            )
+
+    @staticmethod
+    def _make_estimator(name, params, threads, n_estimators=None, early_stopping=False):
+        rounds = n_estimators or MAX_BOOSTING_ROUNDS
+        if name == "Linear":
+            return sklearn_linear.LinearRegression(**params)
+        if name == "XGB":
+            return xgboost.XGBRegressor(n_estimators=rounds, random_state=42, n_jobs=threads,
+                                        early_stopping_rounds=EARLY_STOPPING_ROUNDS if early_stopping else None,
+                                        **params)
+        if name == "RandomForest":
+            return sklearn_ensemble.RandomForestRegressor(random_state=42, n_jobs=threads, **params)
+        if name == "CatBoost":
+            return catboost.CatBoostRegressor(n_estimators=rounds, verbose=0, random_state=42, thread_count=threads,
+                                              allow_writing_files=False, **params)
+        raise ValueError(f"Unknown estimator '{name}'")
+
+    @staticmethod
+    def _fit_fold(name, params, X, y, split, threads):
+        """Validation metrics, early-stopping rounds (boosters only) and fit seconds on one fold."""
+        start = time.perf_counter()
+        train_idx, val_idx = split
+        X_train, X_val = X.iloc[train_idx], X.iloc[val_idx]
+        y_train, y_val = y.iloc[train_idx], y.iloc[val_idx]
+        model = MLService._make_estimator(name, params, threads, early_stopping=True)
+        iterations = None
+        if name == "XGB":
+            model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+            iterations = model.best_iteration + 1
+        elif name == "CatBoost":
+            model.fit(X_train, y_train, eval_set=(X_val, y_val), early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+            iterations = model.get_best_iteration() + 1
+        else:
+            model.fit(X_train, y_train)
+        metrics = MLService.evaluate_model(model, X_val, y_val)
+        return metrics, iterations, time.perf_counter() - start
+
+    @staticmethod
+    def _refit(name, params, X, y, n_estimators, threads):
+        """Final model on all rows; boosters use the CV early-stopping point."""
+        start = time.perf_counter()
+        model = MLService._make_estimator(name, params, threads, n_estimators=n_estimators)
+        model.fit(X, y)
+        return model, time.perf_counter() - start
+
     # ------------------ Prediction ------------------ #
     @staticmethod
     def predict_points(player, fdr_map, models):
@@ -154,3 +290,96 @@ class MLService:
         pred *= min(float(player.get("minutes", 0)) / 90, 1)
 
         return round(pred, 2)
+
+    @staticmethod
+    def _numeric(df, col, default=0.0):
+        if col not in df.columns:
+            return np.full(len(df), default, dtype=float)
+        return pd.to_numeric(df[col], errors="coerce").fillna(default).to_numpy(dtype=float)
+
+    @staticmethod
+    def _flag(df, *cols):
+        flag = np.zeros(len(df), dtype=bool)
+        for col in cols:
+            if col in df.columns:
+                flag |= MLService._numeric(df, col) != 0
+        return flag.astype(float)
+
+    @staticmethod
+    def prediction_inputs(players_df, fdr_map, models):
+        """Per-position model inputs mirroring predict_points.
+
+        Returns ``{pos: (mask, X, scale, offset)}`` where ``mask`` selects the
+        position's rows of players_df and the expected points of those rows are
+        ``model.predict(X) * scale + offset``: ``scale`` folds in availability,
+        discipline and minutes, ``offset`` the MID/FWD set-piece bonus.
+        """
+        inputs = {}
+        if len(players_df) == 0:
+            return inputs
+
+        chance = MLService._numeric(players_df, "chance_of_playing_next_round", 100)
+        chance[chance == 0] = 100
+        availability = chance / 100
+
+        positions = players_df["element_type"].map({1: "GK", 2: "DEF", 3: "MID", 4: "FWD"}).fillna("UNK").to_numpy()
+        minutes = MLService._numeric(players_df, "minutes")
+        team_fdr = players_df["team"].map(lambda t: fdr_map.get(t, 3)).to_numpy(dtype=float)
+
+        columns = {
+            "fdr": team_fdr,
+            "availability": availability,
+            "penalty_taker": MLService._flag(players_df, "penalties_order"),
+            "set_piece_taker": MLService._flag(players_df, "corners_and_indirect_freekicks_order",
+                                               "direct_freekicks_order"),
+        }
+
+        for pos, (model, feats, model_name) in models.items():
+            mask = (positions == pos) & (chance >= 50)
+            if not mask.any():
+                continue
+
+            for f in feats:
+                if f not in columns:
+                    columns[f] = MLService._numeric(players_df, f)
+
+            X = pd.DataFrame(np.column_stack([columns[f][mask] for f in feats]), columns=feats)
+
+            # Discipline penalty
+            yellow = columns["yellow_cards"][mask] if "yellow_cards" in feats else 0
+            red = columns["red_cards"][mask] if "red_cards" in feats else 0
+            discipline = np.maximum(1 - 0.1 * yellow - 0.3 * red, 0)
+
+            # Extra points for MID/FWD
+            bonus = np.zeros(mask.sum())
+            if pos in ["MID", "FWD"]:
+                if "penalty_taker" in feats:
+                    bonus += 0.2 * columns["penalty_taker"][mask]
+                if "set_piece_taker" in feats:
+                    bonus += 0.1 * columns["set_piece_taker"][mask]
+
+            # Scale by minutes played
+            played = np.minimum(minutes[mask] / 90, 1)
+
+            inputs[pos] = (mask, X, availability[mask] * discipline * played, bonus * played)
+
+        return inputs
+
+    @staticmethod
+    def predict_inputs(models, inputs, n):
+        """Unrounded expected points for prediction_inputs(), aligned with the ``n`` input rows."""
+        preds = np.zeros(n)
+        for pos, (mask, X, scale, offset) in inputs.items():
+            preds[mask] = np.asarray(models[pos][0].predict(X), dtype=float) * scale + offset
+        return preds
+
+    @staticmethod
+    @instrument("predict")
+    def predict_batch(players_df, fdr_map, models):
+        """Vectorized predict_points over a DataFrame of raw player rows.
+
+        Builds one feature matrix per position and calls each model once.
+        Returns an array of expected points aligned with the rows of players_df.
+        """
+        inputs = MLService.prediction_inputs(players_df, fdr_map, models)
+        return np.round(MLService.predict_inputs(models, inputs, len(players_df)), 2)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+from app.core.config import MODEL_REGISTRY_DIR, MODEL_REGISTRY_KEEP
+from app.services.compiled_model import ModelCompiler
+from app.services.ml_service import MLService
+
+
+class ModelRegistry:
+    """Keeps the trained position models for the current data snapshot.
+
+    Models are trained once per snapshot, pickled to MODEL_REGISTRY_DIR and
+    served from memory until the snapshot key changes. Their NumPy exports
+    (see ModelCompiler) are stored beside them as ``compiled_{key}.pkl``.
+    """
+    LATEST_FILE = "LATEST"
+    PREFIXES = ("models", "compiled")
+
+    _lock = threading.Lock()
+    _key = None
+    _models = None
+    _compiled_key = None
+    _compiled = None
+
+    @staticmethod
+    def snapshot_key(players, fdr_map, gw):
+        """Hash of the bootstrap players, fixture difficulty and gameweek."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(players, sort_keys=True, separators=(",", ":")).encode())
+        digest.update(json.dumps(sorted(fdr_map.items())).encode())
+        digest.update(str(gw).encode())
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def get_models(players, fdr_map, gw, version=None, train=None):
+        """Return models for the snapshot, training them only on a new key.
+
+        ``version`` is the snapshot version from FPLDataService.fetch_snapshot;
+        without it the key is hashed from the payload itself. ``train(fn, *args)``
+        runs the training call, e.g. in a process pool.
+        """
+        key = version or ModelRegistry.snapshot_key(players, fdr_map, gw)
+        return ModelRegistry.get(key, MLService.train_models, (players, fdr_map), train)
+
+    @staticmethod
+    def get(key, fit, args, train=None):
+        """Return the models stored under ``key``, producing them with ``fit(*args)``."""
+        with ModelRegistry._lock:
+            if ModelRegistry._key == key:
+                return ModelRegistry._models
+
+            models = ModelRegistry._load(key)
+            if models is None:
+                models = train(fit, *args) if train else fit(*args)
+                ModelRegistry._save(key, models)
+
+            ModelRegistry._key = key
+            ModelRegistry._models = models
+            return models
+
+    @staticmethod
+    def load_latest():
+        """Warm the in-memory registry from the last artifact written to disk."""
+        try:
+            with open(os.path.join(MODEL_REGISTRY_DIR, ModelRegistry.LATEST_FILE)) as f:
+                key = f.read().strip()
+        except OSError:
+            return None
+
+        models = ModelRegistry._load(key)
+        if models is not None:
+            with ModelRegistry._lock:
+                ModelRegistry._key = key
+                ModelRegistry._models = models
+        return key if models is not None else None
+
+    @staticmethod
+    def compiled():
+        """NumPy evaluators for the models last returned by get().
+
+        Exported by _save(); artifacts stored before exports existed are
+        compiled here once.
+        """
+        with ModelRegistry._lock:
+            key = ModelRegistry._key
+            if ModelRegistry._compiled_key != key:
+                compiled = ModelRegistry._load(key, "compiled")
+                if compiled is None:
+                    compiled = ModelCompiler.compile_all(ModelRegistry._models)
+                    ModelRegistry._write(ModelRegistry._path(key, "compiled"), compiled)
+                ModelRegistry._compiled_key = key
+                ModelRegistry._compiled = compiled
+            return ModelRegistry._compiled
+
+    @staticmethod
+    def stored_models():
+        """Newest artifact on disk, without ever training; for inference-only serving.
+
+        Prefers the compiled export, so serving needs no model library.
+        Re-reads LATEST on each call so replicas pick up artifacts written by a
+        training process. Raises RuntimeError when there is none.
+        """
+        try:
+            with open(os.path.join(MODEL_REGISTRY_DIR, ModelRegistry.LATEST_FILE)) as f:
+                key = f.read().strip()
+        except OSError:
+            key = None
+
+        with ModelRegistry._lock:
+            if key is None or ModelRegistry._key == key:
+                if ModelRegistry._models is not None:
+                    return ModelRegistry._models
+            else:
+                models = ModelRegistry._load(key, "compiled") or ModelRegistry._load(key)
+                if models is not None:
+                    ModelRegistry._key = key
+                    ModelRegistry._models = models
+                    return models
+                if ModelRegistry._models is not None:
+                    return ModelRegistry._models
+        raise RuntimeError(f"No stored model artifacts in {MODEL_REGISTRY_DIR}; inference-only mode cannot train")
+
+    # ------------------ Persistence ------------------ #
+    @staticmethod
+    def _path(key, prefix="models"):
+        return os.path.join(MODEL_REGISTRY_DIR, f"{prefix}_{key}.pkl")
+
+    @staticmethod
+    def _load(key, prefix="models"):
+        try:
+            with open(ModelRegistry._path(key, prefix), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    @staticmethod
+    def _write(path, obj):
+        os.makedirs(MODEL_REGISTRY_DIR, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _save(key, models):
+        ModelRegistry._write(ModelRegistry._path(key), models)
+        # Before LATEST moves, so inference-only replicas always find the export
+        ModelRegistry._write(ModelRegistry._path(key, "compiled"), ModelCompiler.compile_all(models))
+
+        latest = os.path.join(MODEL_REGISTRY_DIR, ModelRegistry.LATEST_FILE)
+        with open(latest + ".tmp", "w") as f:
+            f.write(key)
+        os.replace(latest + ".tmp", latest)
+
+        ModelRegistry._prune()
+
+    @staticmethod
+    def _prune():
+        for prefix in ModelRegistry.PREFIXES:
+            artifacts = [
+                os.path.join(MODEL_REGISTRY_DIR, name)
+                for name in os.listdir(MODEL_REGISTRY_DIR)
+                if name.startswith(f"{prefix}_") and name.endswith(".pkl")
+            ]
+            artifacts.sort(key=os.path.getmtime, reverse=True)
+            for path in artifacts[MODEL_REGISTRY_KEEP:]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
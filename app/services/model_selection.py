@@ -0,0 +1,168 @@
+import hashlib
+import math
+import os
+import pickle
+
+import numpy as np
+
+from app.core.config import SELECTION_ETA, SELECTION_CACHE_DIR, SELECTION_CACHE_KEEP
+
+
+class Candidate:
+    """One estimator configuration and its per-fold validation metrics."""
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+        self.folds = []
+        self.iterations = []
+        self.seconds = 0.0
+        self.pruned_at = None
+
+    def record(self, metrics, iterations, seconds):
+        self.folds.append(metrics)
+        if iterations is not None:
+            self.iterations.append(iterations)
+        self.seconds += seconds
+
+    def metrics(self):
+        """Metrics averaged over the folds evaluated so far."""
+        return {key: float(np.mean([m[key] for m in self.folds])) for key in ("R2", "RMSE", "MAE")}
+
+    def n_estimators(self):
+        """Boosting rounds for the final fit: the mean early-stopping point over the folds."""
+        return int(round(np.mean(self.iterations))) if self.iterations else None
+
+
+class PositionSearch:
+    """Successive halving over k folds for one position's candidates.
+
+    Rung ``r`` evaluates every surviving candidate on the first
+    ``min(k, 2 ** r)`` folds, so candidates are always compared on the same
+    folds. After each rung the best ``1 / SELECTION_ETA`` survive. The search
+    stops when one candidate is left, every fold has been used, or the next
+    rung would take the position past ``budget`` seconds of fitting. Seconds
+    are estimated per fit by ``cost(candidate)`` rather than measured, so the
+    selection does not depend on machine load or the number of workers. The
+    first rung always runs.
+    """
+
+    def __init__(self, position, X, y, feats, key, candidates, splits, budget, score, cost):
+        self.position = position
+        self.X = X
+        self.y = y
+        self.feats = feats
+        self.key = key
+        self.candidates = candidates
+        self.survivors = list(candidates)
+        self.splits = splits
+        self.budget = budget
+        self.score = score
+        self.cost = {id(c): cost(c) for c in candidates}
+        self.rung = 0
+        self.estimated = 0.0
+        self.spent = 0.0
+        self.done = False
+
+    def rung_folds(self):
+        return min(len(self.splits), 2 ** self.rung)
+
+    def tasks(self):
+        """(candidate, fold) pairs still to evaluate for the current rung."""
+        return [(c, fold) for c in self.survivors for fold in range(len(c.folds), self.rung_folds())]
+
+    def record(self, candidate, metrics, iterations, seconds):
+        candidate.record(metrics, iterations, seconds)
+        self.estimated += self.cost[id(candidate)]
+        self.spent += seconds
+
+    def advance(self):
+        """Rank the survivors after a rung and prune, or finish the search."""
+        # Stable sort keeps candidate order on ties
+        self.survivors.sort(key=lambda c: -self.score(c.metrics()))
+        if len(self.survivors) == 1 or self.rung_folds() == len(self.splits):
+            self.done = True
+            return
+        keep = max(1, math.ceil(len(self.survivors) / SELECTION_ETA))
+        folds = min(len(self.splits), 2 ** (self.rung + 1))
+        upcoming = sum(self.cost[id(c)] * (folds - len(c.folds)) for c in self.survivors[:keep])
+        if self.estimated + upcoming > self.budget:
+            self.done = True
+            return
+        for c in self.survivors[keep:]:
+            c.pruned_at = self.rung
+        self.survivors = self.survivors[:keep]
+        self.rung += 1
+
+    def winner(self):
+        return self.survivors[0]
+
+    def report(self):
+        winner = self.winner()
+        return [
+            {
+                "position": self.position,
+                "model": c.name,
+                "params": c.params,
+                "folds": len(c.folds),
+                **{f"cv_{k.lower()}": round(v, 4) for k, v in c.metrics().items()},
+                "seconds": round(c.seconds, 4),
+                "selected": c is winner,
+                "pruned_at_rung": c.pruned_at,
+                "cached": False,
+            }
+            for c in self.candidates if c.folds
+        ]
+
+
+class SelectionCache:
+    """Selected model per position, keyed by the position's features, data and search settings.
+
+    Positions whose training data did not change reuse the stored model
+    without any fitting.
+    """
+
+    @staticmethod
+    def key(position, feats, X, y, search_space):
+        digest = hashlib.sha256()
+        digest.update(repr((position, list(feats), search_space)).encode())
+        digest.update(np.ascontiguousarray(X.to_numpy(dtype=float)).tobytes())
+        digest.update(np.ascontiguousarray(np.asarray(y, dtype=float)).tobytes())
+        return digest.hexdigest()[:24]
+
+    @staticmethod
+    def _path(key):
+        return os.path.join(SELECTION_CACHE_DIR, f"selection_{key}.pkl")
+
+    @staticmethod
+    def load(key):
+        """``(model_tuple, report)`` or None."""
+        try:
+            with open(SelectionCache._path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    @staticmethod
+    def save(key, model, report):
+        os.makedirs(SELECTION_CACHE_DIR, exist_ok=True)
+        path = SelectionCache._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump((model, report), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        SelectionCache._prune()
+
+    @staticmethod
+    def _prune():
+        entries = [
+            os.path.join(SELECTION_CACHE_DIR, name)
+            for name in os.listdir(SELECTION_CACHE_DIR)
+            if name.startswith("selection_") and name.endswith(".pkl")
+        ]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for path in entries[SELECTION_CACHE_KEEP:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
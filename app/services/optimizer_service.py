@@ -1,6 +1,9 @@
-from pulp import LpMaximize, LpProblem, LpVariable, lpSum, LpBinary, GLPK_CMD, PULP_CBC_CMD
-import re
-from app.core.config import TOTAL_BUDGET, VALID_FORMATIONS
+import threading
+from app.core.config import TOTAL_BUDGET, VALID_FORMATIONS, BENCH_WEIGHT, MAX_PER_CLUB
+from app.core.lazy import lazy_import
+from app.core.metrics import instrument
+
+pulp = lazy_import("pulp")
 
 class OptimizerService:
     @staticmethod
@@ -9,29 +12,31 @@ class OptimizerService:
         return f"player_{idx}"
 
     @staticmethod
+    @instrument("optimize_team")
     def optimize_team(players):
-        prob = LpProblem("FPL_Optimization", LpMaximize)
-        vars_ = {i: LpVariable(OptimizerService._sanitize_name(p["name"], i), cat=LpBinary) for i, p in enumerate(players)}
+        prob = pulp.LpProblem("FPL_Optimization", pulp.LpMaximize)
+        vars_ = {i: pulp.LpVariable(OptimizerService._sanitize_name(p["name"], i), cat=pulp.LpBinary) for i, p in enumerate(players)}
 
-        prob += lpSum(vars_[i] * p["expected_points"] for i, p in enumerate(players))
-        prob += lpSum(vars_[i] * p["price"] for i, p in enumerate(players)) <= TOTAL_BUDGET
-        prob += lpSum(vars_[i] for i in range(len(players))) == 15
+        prob += pulp.lpSum(vars_[i] * p["expected_points"] for i, p in enumerate(players))
+        prob += pulp.lpSum(vars_[i] * p["price"] for i, p in enumerate(players)) <= TOTAL_BUDGET
+        prob += pulp.lpSum(vars_[i] for i in range(len(players))) == 15
 
         pos_limits = {"GK": 2, "DEF": 5, "MID": 5, "FWD": 3}
         for pos, n in pos_limits.items():
-            prob += lpSum(vars_[i] for i, p in enumerate(players) if p["position"] == pos) == n
+            prob += pulp.lpSum(vars_[i] for i, p in enumerate(players) if p["position"] == pos) == n
 
         for team in set(p["team"] for p in players):
-            prob += lpSum(vars_[i] for i, p in enumerate(players) if p["team"] == team) <= 3
+            prob += pulp.lpSum(vars_[i] for i, p in enumerate(players) if p["team"] == team) <= 3
 
         # Try CBC first, fall back to GLPK if CBC isn't available
         try:
-            prob.solve(PULP_CBC_CMD(msg=0))
+            prob.solve(pulp.PULP_CBC_CMD(msg=0))
         except Exception:
-            prob.solve(GLPK_CMD(msg=0))
+            prob.solve(pulp.GLPK_CMD(msg=0))
         return [p for i, p in enumerate(players) if vars_[i].varValue == 1]
 
     @staticmethod
+    @instrument("pick_xi")
     def pick_xi(squad):
         best_points = 0
         best_xi = None
@@ -65,9 +70,155 @@ class OptimizerService:
         vice = safe[1] if len(safe) > 1 else None
         return cap, vice
 
+    @staticmethod
+    def team_summary(squad, xi, formation, captain, vice):
+        bench = [p for p in squad if p not in xi]
+        xi_points = sum(p["expected_points"] for p in xi)
+        bench_points = sum(p["expected_points"] for p in bench)
+
+        if captain:
+            xi_points += captain["expected_points"]
+
+        return {
+            "starting_formation": formation,
+            "starting_xi": OptimizerService.group_pos(xi),
+            "bench": OptimizerService.group_pos(bench),
+            "captain": captain,
+            "vice_captain": vice,
+            "starting_xi_points": xi_points,
+            "bench_points": bench_points,
+            "total_team_cost": sum(p["price"] for p in squad)
+        }
+
+    @staticmethod
+    def formation_indices(names):
+        """Indices into VALID_FORMATIONS for names like "4-4-2"; raises ValueError for unknown ones."""
+        valid = ["{DEF}-{MID}-{FWD}".format(**f) for f in VALID_FORMATIONS]
+        invalid = [x for x in names if x not in valid]
+        if invalid:
+            raise ValueError(f"Invalid formations {invalid}. Must be among {valid}")
+        return [valid.index(x) for x in names]
+
     @staticmethod
     def group_pos(players):
         grouped = {"GK": [], "DEF": [], "MID": [], "FWD": []}
         for p in players:
             grouped[p["position"]].append(p)
         return grouped
+
+
+class SquadModel:
+    """Squad, starting XI, formation and captain chosen in a single MILP.
+
+    The objective counts the XI and captain in full and the bench at
+    BENCH_WEIGHT. The model is built once for a list of enriched players;
+    solve() only changes variable bounds and constraint constants, and
+    warm-starts CBC from the previous solution. ``scores`` replaces expected
+    points as the per-player objective, e.g. risk-adjusted simulated points.
+    One model can therefore serve many managers, each with their own budget,
+    constraints and current squad.
+    """
+
+    @instrument("build_squad_model")
+    def __init__(self, players, budget=TOTAL_BUDGET, max_per_club=MAX_PER_CLUB, scores=None):
+        self.players = players
+        self._lock = threading.Lock()
+        self._last = None
+
+        n = len(players)
+        ep = [p["expected_points"] for p in players] if scores is None else [float(s) for s in scores]
+        self.scores = ep
+        prob = pulp.LpProblem("FPL_Squad", pulp.LpMaximize)
+        self.squad = [pulp.LpVariable(f"squad_{i}", cat=pulp.LpBinary) for i in range(n)]
+        self.xi = [pulp.LpVariable(f"xi_{i}", cat=pulp.LpBinary) for i in range(n)]
+        self.cap = [pulp.LpVariable(f"cap_{i}", cat=pulp.LpBinary) for i in range(n)]
+        self.form = [pulp.LpVariable(f"form_{k}", cat=pulp.LpBinary) for k in range(len(VALID_FORMATIONS))]
+        # Players kept from the manager's current squad; solve() opens kept[i]
+        # only for owned players, which lets it bound the number of transfers
+        self.kept = [pulp.LpVariable(f"kept_{i}", cat=pulp.LpBinary) for i in range(n)]
+        for var in self.kept:
+            var.upBound = 0
+
+        prob += pulp.lpSum(ep[i] * (self.xi[i] + self.cap[i] + BENCH_WEIGHT * (self.squad[i] - self.xi[i]))
+                      for i in range(n))
+
+        by_pos = {"GK": [], "DEF": [], "MID": [], "FWD": []}
+        by_team = {}
+        for i, p in enumerate(players):
+            by_pos[p["position"]].append(i)
+            by_team.setdefault(p["team"], []).append(i)
+
+        prob += (pulp.lpSum(p["price"] * self.squad[i] for i, p in enumerate(players)) <= budget, "budget")
+        prob += pulp.lpSum(self.squad) == 15
+        pos_limits = {"GK": 2, "DEF": 5, "MID": 5, "FWD": 3}
+        for pos, limit in pos_limits.items():
+            prob += pulp.lpSum(self.squad[i] for i in by_pos[pos]) == limit
+        self.club_constraints = []
+        for k, members in enumerate(by_team.values()):
+            name = f"club_{k}"
+            prob += (pulp.lpSum(self.squad[i] for i in members) <= max_per_club, name)
+            self.club_constraints.append(name)
+
+        for i in range(n):
+            prob += self.xi[i] <= self.squad[i]
+            prob += self.cap[i] <= self.xi[i]
+            prob += self.kept[i] <= self.squad[i]
+        prob += (pulp.lpSum(self.kept) >= 0, "transfers")
+        prob += pulp.lpSum(self.xi[i] for i in by_pos["GK"]) == 1
+        prob += pulp.lpSum(self.form) == 1
+        for pos in ["DEF", "MID", "FWD"]:
+            prob += pulp.lpSum(self.xi[i] for i in by_pos[pos]) == pulp.lpSum(
+                f[pos] * self.form[k] for k, f in enumerate(VALID_FORMATIONS))
+        prob += pulp.lpSum(self.cap) == 1
+
+        self.prob = prob
+
+    @instrument("optimize_team")
+    def solve(self, budget=TOTAL_BUDGET, locked=(), excluded=(), max_per_club=MAX_PER_CLUB, formations=None,
+              owned=(), max_transfers=None):
+        """Re-solve under the given constraints.
+
+        ``locked``/``excluded`` are player ids and ``formations`` an optional
+        list of indices into VALID_FORMATIONS. With ``max_transfers`` at most
+        that many squad players may be outside ``owned``, the manager's current
+        squad. Raises ValueError when no squad satisfies the constraints.
+        """
+        locked, excluded, owned = set(locked), set(excluded), set(owned)
+        with self._lock:
+            for i, p in enumerate(self.players):
+                var = self.squad[i]
+                var.lowBound = 1 if p.get("id") in locked else 0
+                var.upBound = 0 if p.get("id") in excluded else 1
+                self.kept[i].upBound = 1 if p.get("id") in owned else 0
+            for k, var in enumerate(self.form):
+                var.upBound = 1 if formations is None or k in formations else 0
+
+            # Constraints are stored as "expr + constant <= 0"
+            self.prob.constraints["budget"].constant = -budget
+            for name in self.club_constraints:
+                self.prob.constraints[name].constant = -max_per_club
+            keep = 15 - max_transfers if max_transfers is not None else 0
+            self.prob.constraints["transfers"].constant = -keep
+
+            warm = self._last is not None
+            if warm:
+                for var, value in zip(self.squad + self.xi + self.cap + self.form, self._last):
+                    var.setInitialValue(value)
+
+            try:
+                self.prob.solve(pulp.PULP_CBC_CMD(msg=0, warmStart=warm))
+            except Exception:
+                self.prob.solve(pulp.GLPK_CMD(msg=0))
+            if pulp.LpStatus[self.prob.status] != "Optimal":
+                raise ValueError(f"No squad satisfies the constraints ({pulp.LpStatus[self.prob.status]})")
+
+            self._last = [round(var.varValue or 0) for var in self.squad + self.xi + self.cap + self.form]
+
+            squad = [p for i, p in enumerate(self.players) if self.squad[i].varValue > 0.5]
+            xi = [p for i, p in enumerate(self.players) if self.xi[i].varValue > 0.5]
+            formation = next(dict(f) for k, f in enumerate(VALID_FORMATIONS) if self.form[k].varValue > 0.5)
+            captain = next(p for i, p in enumerate(self.players) if self.cap[i].varValue > 0.5)
+
+        score = {id(p): s for p, s in zip(self.players, self.scores)}
+        vice = max((p for p in xi if p is not captain), key=lambda x: score[id(x)], default=None)
+        return OptimizerService.team_summary(squad, xi, formation, captain, vice)
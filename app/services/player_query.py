@@ -0,0 +1,325 @@
+import re
+import shlex
+
+import numpy as np
+
+from app.core.config import POSITIONS
+
+
+class PlayerQuery:
+    """Filter, sort and limit over one snapshot's players.
+
+    The text form is space-separated ``key:value`` terms, e.g.::
+
+        position:MID team:Arsenal price:5-8.5 availability:>=0.75 penalty:yes sort:-value limit:10
+
+    ``price`` takes ``A-B``, ``<=B`` or ``>=A`` (bounds are inclusive) and may
+    be repeated; ``availability`` is a minimum as a fraction or percentage;
+    ``sort`` is a SORT_KEYS name, prefixed with ``-``/``+`` to force
+    descending/ascending order. Team names with spaces are quoted.
+    """
+    # Sort key -> descending by default
+    SORT_KEYS = {
+        "expected_points": True, "price": False, "value": True, "total_points": True, "minutes": True,
+        "availability": True, "goals_scored": True, "assists": True,
+    }
+    MAX_LIMIT = 1000
+
+    def __init__(self, position=None, team=None, min_price=None, max_price=None, min_availability=None,
+                 penalty_taker=None, sort="expected_points", descending=None, limit=5):
+        if position is not None and position not in POSITIONS.values():
+            raise ValueError(f"Invalid position '{position}'. Must be one of {list(POSITIONS.values())}")
+        if sort not in PlayerQuery.SORT_KEYS:
+            raise ValueError(f"Invalid sort key '{sort}'. Must be one of {list(PlayerQuery.SORT_KEYS)}")
+        if not 0 < limit <= PlayerQuery.MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {PlayerQuery.MAX_LIMIT}")
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise ValueError(f"Empty price range {min_price}-{max_price}")
+        self.position = position
+        self.team = team
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_availability = min_availability
+        self.penalty_taker = penalty_taker
+        self.sort = sort
+        self.descending = PlayerQuery.SORT_KEYS[sort] if descending is None else descending
+        self.limit = limit
+
+    @staticmethod
+    def parse(text):
+        """PlayerQuery from the text form; raises ValueError on unknown or malformed terms."""
+        try:
+            terms = shlex.split(text or "")
+        except ValueError as e:
+            raise ValueError(f"Malformed query: {e}")
+
+        args = {}
+        for term in terms:
+            key, sep, value = term.partition(":")
+            key = key.lower()
+            if not sep or not value:
+                raise ValueError(f"Expected key:value, got '{term}'")
+            if key in ("position", "pos"):
+                args["position"] = value.upper()
+            elif key == "team":
+                args["team"] = value
+            elif key == "price":
+                low, high = PlayerQuery._range(value)
+                if low is not None:
+                    args["min_price"] = low
+                if high is not None:
+                    args["max_price"] = high
+            elif key == "availability":
+                low, _ = PlayerQuery._range(value if value[0] in "<>" else ">=" + value)
+                args["min_availability"] = low
+            elif key in ("penalty", "penalty_taker"):
+                if value.lower() not in ("yes", "no", "true", "false", "1", "0"):
+                    raise ValueError(f"penalty must be yes or no, got '{value}'")
+                args["penalty_taker"] = value.lower() in ("yes", "true", "1")
+            elif key == "sort":
+                args["sort"], args["descending"] = PlayerQuery.sort_order(value)
+            elif key == "limit":
+                try:
+                    args["limit"] = int(value)
+                except ValueError:
+                    raise ValueError(f"limit must be an integer, got '{value}'")
+            else:
+                raise ValueError(f"Unknown query key '{key}'")
+        return PlayerQuery(**args)
+
+    @staticmethod
+    def sort_order(value):
+        """(key, descending) from "key", "-key" or "+key"; descending is None for the key's default."""
+        descending = None
+        if value[:1] in ("+", "-"):
+            descending = value[0] == "-"
+            value = value[1:]
+        return value.lower(), descending
+
+    def for_position(self, position):
+        """Copy of this query restricted to ``position``."""
+        return PlayerQuery(position, self.team, self.min_price, self.max_price, self.min_availability,
+                           self.penalty_taker, self.sort, self.descending, self.limit)
+
+    @staticmethod
+    def _range(value):
+        """(low, high) from "A-B", "<=B", "<B", ">=A", ">A" or "A%"; one side may be None."""
+        def number(text):
+            text = text.strip().lstrip("£").rstrip("m")
+            percent = text.endswith("%")
+            try:
+                x = float(text.rstrip("%"))
+            except ValueError:
+                raise ValueError(f"Expected a number, got '{text}'")
+            return x / 100 if percent else x
+
+        for op in ("<=", ">=", "<", ">"):
+            if value.startswith(op):
+                x = number(value[len(op):])
+                return (None, x) if op[0] == "<" else (x, None)
+        low, sep, high = value.partition("-")
+        if sep:
+            return number(low), number(high)
+        x = number(value)
+        return x, x
+
+    def text(self):
+        """Canonical text form; PlayerQuery.parse(q.text()) gives the same query."""
+        terms = []
+        if self.position:
+            terms.append(f"position:{self.position}")
+        if self.team:
+            terms.append("team:" + shlex.quote(self.team))
+        if self.min_price is not None and self.max_price is not None:
+            terms.append(f"price:{self.min_price:g}-{self.max_price:g}")
+        elif self.min_price is not None:
+            terms.append(f"price:>={self.min_price:g}")
+        elif self.max_price is not None:
+            terms.append(f"price:<={self.max_price:g}")
+        if self.min_availability is not None:
+            terms.append(f"availability:>={self.min_availability:g}")
+        if self.penalty_taker is not None:
+            terms.append(f"penalty:{'yes' if self.penalty_taker else 'no'}")
+        terms.append(f"sort:{'-' if self.descending else '+'}{self.sort}")
+        terms.append(f"limit:{self.limit}")
+        return " ".join(terms)
+
+
+class MessageParser:
+    """Turns simple natural-language requests into PlayerQuery objects.
+
+    Recognises positions, team names, price bounds ("under 7m", "between 5
+    and 6.5"), availability ("fit", "75% chance"), penalty takers, a sort
+    ("cheapest", "best value", "most points") and a count ("top 10"). Only
+    a message with at least one filter (position, team, price, availability
+    or penalties) is a player request; "best team" alone is not.
+    """
+    POSITION_WORDS = {
+        "GK": r"goalkeepers?|keepers?|gks?|goalies?",
+        "DEF": r"defenders?|defs?|defence|defense|centre[- ]backs?|full[- ]backs?",
+        "MID": r"midfielders?|mids?|midfield",
+        "FWD": r"forwards?|fwds?|strikers?|attackers?",
+    }
+    SORT_WORDS = [
+        (r"most expensive|premium|priciest", "price", True),
+        (r"cheapest|cheap|budget|bargains?", "price", False),
+        (r"value", "value", True),
+        (r"most points|highest scoring|total points", "total_points", True),
+        (r"most minutes|nailed", "minutes", True),
+        (r"goals|goalscorers?|scorers?", "goals_scored", True),
+        (r"assists|creators?", "assists", True),
+    ]
+    NUMBER = r"£?\s*(\d+(?:\.\d+)?)\s*m?"
+    FILTERS = ("position", "team", "min_price", "max_price", "min_availability", "penalty_taker")
+
+    def __init__(self, team_aliases=None):
+        # alias (lower case) -> team name, longest first so "man city" wins over "city"
+        self.team_aliases = sorted((team_aliases or {}).items(), key=lambda item: -len(item[0]))
+
+    def parse(self, message):
+        """PlayerQuery for ``message``, or None when it is not a player request."""
+        text = " " + message.lower() + " "
+        args = {}
+
+        m = re.search(r"(\d{1,3})\s*%", text)
+        if m:
+            args["min_availability"] = min(int(m.group(1)), 100) / 100
+            text = text[:m.start()] + " " + text[m.end():]
+        elif re.search(r"\b(fully fit|fit|available|healthy|not injured)\b", text):
+            args["min_availability"] = 1.0
+
+        m = re.search(rf"between\s+{self.NUMBER}\s+and\s+{self.NUMBER}", text)
+        if m:
+            args["min_price"], args["max_price"] = sorted((float(m.group(1)), float(m.group(2))))
+            text = text[:m.start()] + " " + text[m.end():]
+        for bound, words in (("max_price", r"under|below|less than|cheaper than|up to|at most|max(?:imum)?|<=?"),
+                             ("min_price", r"over|above|more than|at least|min(?:imum)?|>=?")):
+            m = re.search(rf"(?<!\w)(?:{words})\s*{self.NUMBER}", text)
+            if m:
+                args[bound] = float(m.group(1))
+                text = text[:m.start()] + " " + text[m.end():]
+
+        for position, words in self.POSITION_WORDS.items():
+            if re.search(rf"\b({words})\b", text):
+                args["position"] = position
+                break
+
+        for alias, name in self.team_aliases:
+            if re.search(rf"(?<![\w']){re.escape(alias)}(?![\w'])", text):
+                args["team"] = name
+                break
+
+        if re.search(r"\b(pen|pens|penalty|penalties)\b", text):
+            args["penalty_taker"] = True
+
+        for words, key, descending in self.SORT_WORDS:
+            if re.search(rf"\b({words})\b", text):
+                args["sort"], args["descending"] = key, descending
+                break
+
+        m = re.search(r"\b(?:top|best|show me|list|give me)\s+(\d+)\b", text) or re.search(r"\b(\d+)\s+[a-z]+s\b", text)
+        if m and 0 < int(m.group(1)) <= PlayerQuery.MAX_LIMIT:
+            args["limit"] = int(m.group(1))
+
+        if not any(key in args for key in self.FILTERS):
+            return None
+        return PlayerQuery(**args)
+
+
+class PlayerIndex:
+    """Secondary indexes over one snapshot's PlayerTable for PlayerQuery lookups.
+
+    Players with positive expected points are indexed (the /top and squad
+    candidates). Each position, team and penalty-taker flag is a bitmap
+    (``np.packbits``) that queries AND together; price ranges are resolved
+    by binary search in price-sorted row arrays, overall and per position.
+    Top-k selection partitions on the sort key before sorting, with ties
+    broken by table row (the order of a stable sort).
+    """
+
+    def __init__(self, table, teams=()):
+        self.records = table.records
+        f = table.frame
+        self.n = n = len(self.records)
+        ep = f["expected_points"].to_numpy(dtype=float)
+        price = f["price"].to_numpy(dtype=float)
+        eligible = ep > 0
+        self._keys = {
+            "expected_points": ep,
+            "price": price,
+            "value": np.divide(ep, price, out=np.zeros(n), where=price > 0),
+            **{key: f[key].to_numpy(dtype=float)
+               for key in ("total_points", "minutes", "availability", "goals_scored", "assists")},
+        }
+
+        positions = f["position"].to_numpy()
+        team_names = f["team"].to_numpy()
+        penalty = f["penalty_taker"].to_numpy() == 1
+        self._flags = {("eligible", None): eligible}
+        for pos in POSITIONS.values():
+            self._flags[("position", pos)] = eligible & (positions == pos)
+        for name in dict.fromkeys(team_names):
+            self._flags[("team", name)] = eligible & (team_names == name)
+        self._flags[("penalty_taker", True)] = eligible & penalty
+        self._flags[("penalty_taker", False)] = eligible & ~penalty
+        self._bitmaps = {key: np.packbits(mask) for key, mask in self._flags.items()}
+
+        # Price-sorted eligible rows, overall (None) and per position
+        self._by_price = {}
+        for pos in [None, *POSITIONS.values()]:
+            mask = self._flags[("eligible", None) if pos is None else ("position", pos)]
+            rows = np.flatnonzero(mask)
+            rows = rows[np.argsort(price[rows], kind="stable")]
+            self._by_price[pos] = (rows, price[rows])
+
+        aliases = {name.lower(): name for name in dict.fromkeys(team_names)}
+        for t in teams:
+            if t.get("name") in aliases.values():
+                for alias in (t.get("short_name"), t.get("name")):
+                    if alias:
+                        aliases[alias.lower()] = t["name"]
+        self.team_aliases = aliases
+        self.messages = MessageParser(aliases)
+
+    def team(self, name):
+        """Canonical team name for a name or short name; raises ValueError if unknown."""
+        team = self.team_aliases.get(name.lower())
+        if team is None:
+            raise ValueError(f"Unknown team '{name}'")
+        return team
+
+    def query(self, q):
+        """Records matching ``q``, sorted and limited."""
+        filters = []
+        if q.team is not None:
+            filters.append(("team", self.team(q.team)))
+        if q.penalty_taker is not None:
+            filters.append(("penalty_taker", bool(q.penalty_taker)))
+
+        if q.min_price is not None or q.max_price is not None:
+            rows, prices = self._by_price[q.position]
+            lo = 0 if q.min_price is None else np.searchsorted(prices, q.min_price - 1e-9, "left")
+            hi = len(rows) if q.max_price is None else np.searchsorted(prices, q.max_price + 1e-9, "right")
+            rows = rows[lo:hi]
+            for key in filters:
+                rows = rows[self._flags[key][rows]]
+        else:
+            bits = self._bitmaps[("eligible", None) if q.position is None else ("position", q.position)]
+            for key in filters:
+                bits = bits & self._bitmaps[key]
+            rows = np.flatnonzero(np.unpackbits(bits, count=self.n))
+
+        if q.min_availability is not None:
+            rows = rows[self._keys["availability"][rows] >= q.min_availability - 1e-9]
+        return [self.records[i] for i in self._top(rows, q.sort, q.descending, q.limit)]
+
+    def _top(self, rows, sort, descending, limit):
+        key = self._keys[sort][rows]
+        if not descending:
+            key = -key
+        if len(rows) > limit:
+            # Keep everything tied with the k-th best so the tie-break below is exact
+            kth = np.partition(key, len(key) - limit)[len(key) - limit]
+            keep = key >= kth
+            rows, key = rows[keep], key[keep]
+        return rows[np.lexsort((rows, -key))][:limit]
@@ -0,0 +1,138 @@
+import numpy as np
+
+from app.core.config import POSITIONS, BASE_IMAGE_URL
+from app.core.lazy import lazy_import
+from app.core.metrics import instrument
+from app.services.ml_service import MLService
+
+pd = lazy_import("pandas")
+
+
+class PlayerTable:
+    """Enriched players for one data snapshot.
+
+    ``frame`` is a columnar view indexed by player id; ``records`` holds the
+    same rows as the JSON-ready dicts the endpoints return. Both are built
+    once per snapshot and must not be mutated by callers.
+    """
+    FIELDS = ["id", "name", "team", "position", "price", "expected_points", "minutes", "chance",
+              "penalty_taker", "set_piece_taker", "yellow_cards", "red_cards", "availability",
+              "image", "model_used"]
+    STATS = ["team_id", "goals_scored", "assists", "clean_sheets", "saves", "total_points"]
+    RISK_FACTORS = ["availability", "cards", "rotation"]
+
+    def __init__(self, records, stats):
+        self.records = records
+        self.frame = pd.DataFrame(
+            [{**r, **s} for r, s in zip(records, stats)],
+            columns=PlayerTable.FIELDS + PlayerTable.STATS,
+        ).set_index("id", drop=False)
+        self._row = {r["id"]: i for i, r in enumerate(records)}
+
+        ep = self.frame["expected_points"].to_numpy()
+        self.candidates = [records[i] for i in range(len(records)) if ep[i] > 0]
+
+        # Risk factors as a row-aligned matrix for squad aggregates
+        f = self.frame
+        availability = f["availability"].to_numpy(dtype=float)
+        yellow = f["yellow_cards"].to_numpy(dtype=float)
+        red = f["red_cards"].to_numpy(dtype=float)
+        self._risk = np.column_stack([
+            0.5 * (1 - availability),
+            0.3 * (yellow * 0.1 + red * 0.3),
+            np.where(f["minutes"].to_numpy(dtype=float) < 60, 0.2, 0.0),
+        ])
+        self._expected = ep.astype(float)
+
+    @staticmethod
+    @instrument("enrich")
+    def build(players, teams, fdr_map, models, expected=None):
+        """Enrich the bootstrap players; ``expected`` overrides the season-model predictions."""
+        team_map = {t["id"]: t["name"] for t in teams}
+        if expected is None:
+            expected = MLService.predict_batch(pd.DataFrame(players), fdr_map, models)
+
+        records, stats = [], []
+        for p, ep in zip(players, expected):
+            pos = POSITIONS.get(p.get("element_type"), "UNK")
+
+            # Only MID/FWD get penalty/set-piece
+            if pos in ["MID", "FWD"]:
+                penalty_taker = 1 if p.get("penalties_order") else 0
+                set_piece_taker = 1 if (p.get("corners_and_indirect_freekicks_order") or
+                                        p.get("direct_freekicks_order")) else 0
+            else:
+                penalty_taker = 0
+                set_piece_taker = 0
+
+            records.append({
+                "id": p["id"],
+                "name": f"{p['first_name']} {p['second_name']}",
+                "team": team_map.get(p["team"], "Unknown"),
+                "position": pos,
+                "price": p["now_cost"] / 10,
+                "expected_points": float(ep),
+                "minutes": p.get("minutes", 0),
+                "chance": p.get("chance_of_playing_next_round", 100),
+                "penalty_taker": penalty_taker,
+                "set_piece_taker": set_piece_taker,
+                "yellow_cards": p.get("yellow_cards", 0),
+                "red_cards": p.get("red_cards", 0),
+                "availability": (p.get("chance_of_playing_next_round", 100) or 100) / 100,
+                "image": BASE_IMAGE_URL + p.get("photo", ""),
+                "model_used": models[pos][2] if pos in models else "Unknown",
+            })
+            stats.append({
+                "team_id": p["team"],
+                "goals_scored": p.get("goals_scored", 0),
+                "assists": p.get("assists", 0),
+                "clean_sheets": p.get("clean_sheets", 0),
+                "saves": p.get("saves", 0),
+                "total_points": p.get("total_points", 0),
+            })
+
+        return PlayerTable(records, stats)
+
+    def get(self, player_id):
+        """Enriched record for a player id, or None."""
+        i = self._row.get(player_id)
+        return None if i is None else self.records[i]
+
+    def rows(self, player_ids):
+        """Row positions for player ids in the given order, unknown ids dropped."""
+        return self.bulk_rows([player_ids])[0]
+
+    def bulk_rows(self, squads):
+        """Row positions for many id lists, resolved with a single index lookup."""
+        flat = [pid for ids in squads for pid in ids]
+        idx = self.frame.index.get_indexer(flat) if flat else np.array([], dtype=int)
+        out, start = [], 0
+        for ids in squads:
+            chunk = idx[start:start + len(ids)]
+            out.append(chunk[chunk >= 0])
+            start += len(ids)
+        return out
+
+    def risk(self, rows):
+        """Per-player risk scores from availability, cards and rotation."""
+        factors = self._risk[rows]
+        scores = factors[:, 0] + factors[:, 1] + factors[:, 2]
+        return [
+            {
+                "name": self.records[i]["name"],
+                "position": self.records[i]["position"],
+                "risk_score": round(float(score), 2),
+                "factors": {name: round(float(v), 2) for name, v in zip(PlayerTable.RISK_FACTORS, row)},
+            }
+            for i, score, row in zip(rows, scores, factors)
+        ]
+
+    def impact(self, rows, contributions):
+        """Squad totals of expected points and of each feature's contribution.
+
+        ``contributions`` is the snapshot's FeatureContributions.
+        """
+        return {
+            "total_predicted_points": round(float(self._expected[rows].sum()), 2),
+            "feature_impact_summary": contributions.summary(rows),
+        }
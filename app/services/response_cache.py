@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import logging
+
+import orjson
+from fastapi import Response
+
+from app.core.config import RESPONSE_CACHE_SIZE, RESPONSE_MAX_AGE
+from app.core.metrics import timed
+from app.services.cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+def _default(obj):
+    # NumPy scalars that OPT_SERIALIZE_NUMPY does not cover
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class RenderedResponse:
+    """One response body, serialized once, with its compressed variants.
+
+    Every encoding has its own strong ETag derived from the JSON bytes.
+    """
+
+    def __init__(self, content):
+        self.body = orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.encodings = {None: (self.body, f'"{digest}"')}
+        self.encodings["gzip"] = (gzip.compress(self.body, compresslevel=6), f'"{digest}-gzip"')
+        if brotli is not None:
+            self.encodings["br"] = (brotli.compress(self.body, quality=5), f'"{digest}-br"')
+
+    def negotiate(self, accept_encoding):
+        """Preferred encoding the client accepts: br, then gzip, else identity."""
+        accepted = set()
+        for part in (accept_encoding or "").split(","):
+            name, _, params = part.partition(";")
+            params = params.replace(" ", "")
+            try:
+                if params.startswith("q=") and float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+            accepted.add(name.strip().lower())
+        for encoding in ("br", "gzip"):
+            if encoding in self.encodings and (encoding in accepted or "*" in accepted):
+                return encoding
+        return None
+
+    def etags(self):
+        return {etag for _, etag in self.encodings.values()}
+
+    def response(self, request):
+        """200 with the negotiated body, or 304 when If-None-Match names this content."""
+        headers = request.headers if request is not None else {}
+        encoding = self.negotiate(headers.get("accept-encoding"))
+        body, etag = self.encodings[encoding]
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={RESPONSE_MAX_AGE}, must-revalidate",
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match:
+            # Weak comparison, as If-None-Match requires; any encoding of the
+            # same JSON is the same content
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or tags & self.etags():
+                return Response(status_code=304, headers=response_headers)
+
+        if encoding is not None:
+            response_headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=response_headers)
+
+
+class ResponseCache:
+    """Serialized endpoint responses for the current snapshot.
+
+    Keys start with the snapshot version, so a body is never served for a
+    newer snapshot; SnapshotService clears the cache when it swaps one in.
+    Functions registered with warmer() pre-render the common parameter
+    combinations for each new snapshot before it is published.
+    """
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE):
+        self._cache = LRUCache(maxsize)
+        self._warmers = []
+
+    def get(self, version, key):
+        return self._cache.get((version, key))
+
+    def put(self, version, key, content):
+        with timed("serialize"):
+            rendered = RenderedResponse(content)
+        self._cache.put((version, key), rendered)
+        return rendered
+
+    def warmer(self, fn):
+        """Register ``fn(snapshot)``, called by warm() for every new snapshot."""
+        self._warmers.append(fn)
+        return fn
+
+    def warm(self, snapshot):
+        for fn in self._warmers:
+            try:
+                fn(snapshot)
+            except Exception:
+                logger.exception("Could not pre-render responses with %s", fn.__name__)
+
+    def clear(self):
+        self._cache.clear()
+
+    def __len__(self):
+        return len(self._cache)
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from app.core.config import REFRESH_FAST_INTERVAL, REFRESH_SLOW_INTERVAL, REFRESH_DEADLINE_WINDOW
+from app.services.data_service import FPLDataService
+from app.services.executors import train_in_pool
+from app.services.history_store import history
+from app.services.snapshot_service import SnapshotService
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    """Background task that keeps SnapshotService current.
+
+    Fetching, training, enrichment and the squad solve all run in the default
+    executor, and the finished snapshot is swapped in with a single reference
+    assignment. Polling is fast within REFRESH_DEADLINE_WINDOW of a gameweek
+    deadline and slow otherwise.
+    """
+
+    def __init__(self, fast_interval=REFRESH_FAST_INTERVAL, slow_interval=REFRESH_SLOW_INTERVAL,
+                 deadline_window=REFRESH_DEADLINE_WINDOW):
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.deadline_window = deadline_window
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            SnapshotService.background = True
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        SnapshotService.background = False
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                snapshot = await loop.run_in_executor(None, lambda: SnapshotService.refresh(force=True, warm=True, train=train_in_pool))
+                await loop.run_in_executor(None, history.sync, snapshot.events, FPLDataService.fetch_json,
+                                           [p["id"] for p in snapshot.players])
+                delay = self.next_delay(snapshot.events)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Snapshot refresh failed")
+                delay = self.fast_interval
+            await asyncio.sleep(delay)
+
+    def next_delay(self, events, now=None):
+        """Seconds until the next poll given the gameweek deadlines."""
+        now = now or datetime.now(timezone.utc)
+        delay = self.slow_interval
+
+        for event in events:
+            deadline = FPLDataService.parse_time(event.get("deadline_time"))
+            if deadline is None:
+                continue
+            seconds = (deadline - now).total_seconds()
+            if abs(seconds) <= self.deadline_window:
+                return self.fast_interval
+            if seconds > 0:
+                # Wake up when the next deadline window opens
+                delay = min(delay, seconds - self.deadline_window)
+
+        return max(delay, self.fast_interval)
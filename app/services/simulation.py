@@ -0,0 +1,116 @@
+import numpy as np
+
+from app.core.config import SIM_SCENARIOS, SIM_SEED, RISK_PROFILES
+from app.core.metrics import instrument
+
+
+class PointsSimulator:
+    """Samples gameweek points for every player of a snapshot.
+
+    Per scenario a player plays with probability availability x minutes share
+    and, if so, gets 2 appearance points for 60+ minutes (1 otherwise), clean
+    sheet points by position with a fixture-dependent probability, and a
+    Poisson number of attacking returns. The return rate is calibrated so the
+    simulated mean matches the model's expected points.
+    """
+    CLEAN_SHEET_POINTS = {"GK": 4, "DEF": 4, "MID": 1, "FWD": 0}
+    # Average of goal and assist points by position
+    RETURN_POINTS = {"GK": 4.5, "DEF": 4.5, "MID": 4.0, "FWD": 3.5}
+    PERCENTILES = [10, 25, 50, 75, 90]
+    CHUNK = 2000
+
+    @staticmethod
+    def parameters(frame, fdr_map, gw):
+        """Per-player (p_play, p_full, cs_prob, cs_points, lam, return_points) arrays."""
+        ep = frame["expected_points"].to_numpy(dtype=float)
+        positions = frame["position"].to_numpy()
+        availability = frame["availability"].to_numpy(dtype=float)
+        played = max((gw or 39) - 1, 1)
+        share = np.clip(frame["minutes"].to_numpy(dtype=float) / (90 * played), 0, 1)
+
+        p_play = np.where(ep > 0, availability * np.clip(share, 0.05, 1), 0.0)
+        p_full = np.clip(share, 0.25, 0.95)
+        fdr = frame["team_id"].map(lambda t: fdr_map.get(t, 3)).to_numpy(dtype=float)
+        cs_prob = np.clip(0.45 - 0.07 * (fdr - 2), 0.1, 0.5)
+        cs_points = np.array([PointsSimulator.CLEAN_SHEET_POINTS.get(p, 0) for p in positions], dtype=float)
+        return_points = np.array([PointsSimulator.RETURN_POINTS.get(p, 4.0) for p in positions])
+
+        # Expected points per appearance; low values mean fewer appearances rather than negative returns
+        per_game = np.divide(ep, p_play, out=np.zeros_like(ep), where=p_play > 0)
+        appearance = 1 + p_full
+        short = per_game < appearance
+        p_play = np.where(short, ep / appearance, p_play)
+        cs_prob = np.where(short, 0, np.minimum(cs_prob, np.divide(
+            per_game - appearance, p_full * cs_points, out=np.full_like(ep, np.inf), where=cs_points > 0)))
+        lam = np.maximum(per_game - appearance - p_full * cs_prob * cs_points, 0) / return_points
+        lam[short] = 0
+        return p_play, p_full, cs_prob, cs_points, lam, return_points
+
+    @staticmethod
+    @instrument("simulate_points")
+    def simulate(frame, fdr_map, gw, scenarios=SIM_SCENARIOS, seed=SIM_SEED):
+        """PointsDistribution over ``scenarios`` draws for the rows of PlayerTable.frame."""
+        p_play, p_full, cs_prob, cs_points, lam, return_points = PointsSimulator.parameters(frame, fdr_map, gw)
+        rng = np.random.default_rng(seed)
+        n = len(frame)
+        samples = np.empty((scenarios, n), dtype=np.float32)
+        for start in range(0, scenarios, PointsSimulator.CHUNK):
+            size = min(PointsSimulator.CHUNK, scenarios - start)
+            plays = rng.random((size, n)) < p_play
+            full = plays & (rng.random((size, n)) < p_full)
+            clean_sheet = full & (rng.random((size, n)) < cs_prob)
+            points = plays.astype(np.float32) + full
+            points += clean_sheet * cs_points.astype(np.float32)
+            points += plays * (rng.poisson(lam, (size, n)) * return_points).astype(np.float32)
+            samples[start:start + size] = points
+        return PointsDistribution(samples)
+
+
+class PointsDistribution:
+    """Simulated points, one column per PlayerTable row."""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.mean = samples.mean(axis=0, dtype=np.float64)
+        self.std = samples.std(axis=0, dtype=np.float64)
+        self.percentiles = np.percentile(samples, PointsSimulator.PERCENTILES, axis=0)
+
+    def scores(self, profile):
+        """Objective coefficients for a RISK_PROFILES name: mean + weight x std."""
+        if profile not in RISK_PROFILES:
+            raise ValueError(f"Invalid risk profile '{profile}'. Must be one of {list(RISK_PROFILES)}")
+        return self.mean + RISK_PROFILES[profile] * self.std
+
+    def player(self, row):
+        return {
+            "mean": round(float(self.mean[row]), 2),
+            "std": round(float(self.std[row]), 2),
+            **{f"p{q}": round(float(v), 2) for q, v in zip(PointsSimulator.PERCENTILES, self.percentiles[:, row])},
+            "blank_probability": round(float((self.samples[:, row] <= 2).mean()), 3),
+        }
+
+    def captaincy(self, rows):
+        """Probability that each row outscores the others in ``rows``.
+
+        A scenario in which several rows tie for the most points is split
+        evenly between them.
+        """
+        rows = np.asarray(rows, dtype=int)
+        if len(rows) == 0:
+            return np.zeros(0)
+        points = self.samples[:, rows]
+        best = points == points.max(axis=1, keepdims=True)
+        wins = (best / best.sum(axis=1, keepdims=True)).sum(axis=0, dtype=np.float64)
+        return wins / len(self.samples)
+
+    def squad(self, xi_rows, captain_row=None):
+        """Distribution of the XI's total, with the captain's points doubled."""
+        totals = self.samples[:, xi_rows].sum(axis=1, dtype=np.float64)
+        if captain_row is not None:
+            totals += self.samples[:, captain_row]
+        return {
+            "mean": round(float(totals.mean()), 2),
+            "std": round(float(totals.std()), 2),
+            **{f"p{q}": round(float(v), 2) for q, v in zip(PointsSimulator.PERCENTILES,
+                                                           np.percentile(totals, PointsSimulator.PERCENTILES))},
+        }
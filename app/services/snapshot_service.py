@@ -0,0 +1,309 @@
+import logging
+import threading
+
+import numpy as np
+
+from app.core.config import TOTAL_BUDGET, MAX_PER_CLUB, TEAM_CACHE_SIZE, HISTORY_DIR, RISK_PROFILES, INFERENCE_ONLY
+from app.core.lazy import lazy_import
+from app.core.metrics import timed
+from app.services.cache import LRUCache
+from app.services.coalesce import SingleFlight
+from app.services.data_service import FPLDataService
+from app.services.executors import run_in_thread, train_in_pool
+from app.services.explainer import Explainer
+from app.services.history_store import history
+from app.services.history_training import GameweekTrainer
+from app.services.ml_service import MLService
+from app.services.model_registry import ModelRegistry
+from app.services.optimizer_service import SquadModel
+from app.services.player_query import PlayerIndex
+from app.services.player_table import PlayerTable
+from app.services.response_cache import ResponseCache
+from app.services.simulation import PointsSimulator
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Everything the endpoints derive from one version of the FPL data.
+
+    A snapshot is never modified after it is published, so a request that
+    holds a reference keeps a consistent view across a refresh.
+    """
+
+    def __init__(self, version, gw, players, teams, fixtures, events, fdr_map, fdr_index, models, table, inputs,
+                 model_kind="season", native_models=None):
+        self.version = version
+        self.gw = gw
+        self.players = players
+        self.teams = teams
+        self.fixtures = fixtures
+        self.events = events
+        self.fdr_map = fdr_map
+        # Team x gameweek difficulty matrix for windowed fixture queries
+        self.fdr_index = fdr_index
+        # Serving models (ModelCompiler exports where possible) and the library
+        # models they came from; the latter are None in inference-only mode
+        self.models = models
+        self.native_models = native_models
+        self.table = table
+        # Per-position model inputs behind the predictions, see MLService.prediction_inputs
+        self.inputs = inputs
+        # "season" for MLService season-total models, "gameweek" for GameweekTrainer models
+        self.model_kind = model_kind
+        self._squad_models = {}
+        self._simulation = None
+        self._contributions = None
+        self._index = None
+        self._team = None
+        self._lock = threading.Lock()
+
+    def simulation(self):
+        """Monte Carlo points distribution for every player, simulated once."""
+        if self._simulation is None:
+            with self._lock:
+                if self._simulation is None:
+                    self._simulation = PointsSimulator.simulate(self.table.frame, self.fdr_map, self.gw)
+        return self._simulation
+
+    def contributions(self):
+        """Per-feature contributions to every player's expected points, computed once.
+
+        Uses the library models' SHAP values when they are loaded, otherwise
+        the compiled models' path attributions.
+        """
+        if self._contributions is None:
+            with self._lock:
+                if self._contributions is None:
+                    self._contributions = Explainer.explain(self.native_models or self.models, self.inputs,
+                                                            len(self.players))
+        return self._contributions
+
+    def index(self):
+        """Secondary indexes over the enriched players for PlayerQuery lookups, built once."""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = PlayerIndex(self.table, self.teams)
+        return self._index
+
+    def squad_model(self, risk="neutral"):
+        """Joint squad MILP over this snapshot's candidates, built once per risk profile.
+
+        Profiles other than "neutral" optimise simulated mean + weight x std
+        instead of expected points.
+        """
+        model = self._squad_models.get(risk)
+        if model is None:
+            scores = self.candidate_scores(risk)
+            with self._lock:
+                model = self._squad_models.get(risk)
+                if model is None:
+                    model = self._squad_models[risk] = SquadModel(self.table.candidates, scores=scores)
+        return model
+
+    def candidate_scores(self, risk="neutral"):
+        """Objective per table candidate for a risk profile; None means expected points."""
+        if risk == "neutral":
+            return None
+        rows = self.table.rows([p["id"] for p in self.table.candidates])
+        return self.simulation().scores(risk)[rows]
+
+    def best_team(self):
+        """Unconstrained optimal squad for this snapshot, solved once."""
+        if self._team is None:
+            team = self.squad_model().solve()
+            with self._lock:
+                if self._team is None:
+                    self._team = team
+        return self._team
+
+    def team_constraints(self, budget=TOTAL_BUDGET, locked=(), excluded=(), max_per_club=MAX_PER_CLUB,
+                         formations=None):
+        """Normalised constraint tuple for team(), or None for the defaults.
+
+        ``formations`` are indices into VALID_FORMATIONS. Raises ValueError for
+        conflicting ids and for locked players that cannot be selected.
+        """
+        locked = tuple(sorted(set(locked)))
+        excluded = tuple(sorted(set(excluded)))
+        formations = tuple(sorted(set(formations))) if formations else None
+        budget = round(budget, 1)
+        if (budget, locked, excluded, max_per_club, formations) == (TOTAL_BUDGET, (), (), MAX_PER_CLUB, None):
+            return None
+
+        conflict = set(locked) & set(excluded)
+        if conflict:
+            raise ValueError(f"Players both locked and excluded: {sorted(conflict)}")
+        candidate_ids = {p["id"] for p in self.table.candidates}
+        unavailable = [pid for pid in locked if pid not in candidate_ids]
+        if unavailable:
+            raise ValueError(f"Locked players not available for selection: {unavailable}")
+        return budget, locked, excluded, max_per_club, formations
+
+    def team(self, *args, risk="neutral", **kwargs):
+        """Optimal squad under user constraints, cached by constraint set, risk profile and version.
+
+        Takes the team_constraints() arguments and a RISK_PROFILES name; raises
+        ValueError when they are invalid or infeasible.
+        """
+        if risk not in RISK_PROFILES:
+            raise ValueError(f"Invalid risk profile '{risk}'. Must be one of {list(RISK_PROFILES)}")
+        constraints = self.team_constraints(*args, **kwargs)
+        if constraints is None and risk == "neutral":
+            return self.best_team()
+
+        key = (self.version, risk, constraints)
+        team = SnapshotService.team_cache.get(key)
+        if team is None:
+            team = self.squad_model(risk).solve(*(constraints or ()))
+            SnapshotService.team_cache.put(key, team)
+        return team
+
+    async def ateam(self, *args, risk="neutral", **kwargs):
+        """team() off the event loop, coalescing identical concurrent requests."""
+        if risk not in RISK_PROFILES:
+            raise ValueError(f"Invalid risk profile '{risk}'. Must be one of {list(RISK_PROFILES)}")
+        constraints = self.team_constraints(*args, **kwargs)
+        if constraints is None and risk == "neutral" and self._team is not None:
+            return self._team
+        cached = SnapshotService.team_cache.get((self.version, risk, constraints))
+        if cached is not None:
+            return cached
+        return await SnapshotService.flight.run(
+            ("team", self.version, risk, constraints),
+            lambda: run_in_thread(self.team, *(constraints or ()), risk=risk)
+        )
+
+    def team_distribution(self, team):
+        """Simulated XI points and captaincy win-probabilities for a team() result."""
+        xi = [p for players in team["starting_xi"].values() for p in players]
+        rows = self.table.rows([p["id"] for p in xi])
+        captain = team["captain"]
+        captain_row = self.table.rows([captain["id"]])[0] if captain else None
+        simulation = self.simulation()
+        return {
+            "points_distribution": simulation.squad(rows, captain_row),
+            "captain_probabilities": {
+                p["name"]: round(float(prob), 3) for p, prob in zip(xi, simulation.captaincy(rows))
+            },
+        }
+
+
+class SnapshotService:
+    _current = None
+    _lock = threading.Lock()
+    team_cache = LRUCache(TEAM_CACHE_SIZE)
+    responses = ResponseCache()
+    flight = SingleFlight()
+
+    # Set while the background scheduler keeps _current up to date
+    background = False
+
+    @staticmethod
+    def get():
+        """Return the current snapshot.
+
+        With the background scheduler running this never touches the data
+        service; otherwise the snapshot is rebuilt on a version change.
+        """
+        current = SnapshotService._current
+        if current is not None and SnapshotService.background:
+            return current
+        return SnapshotService.refresh()
+
+    @staticmethod
+    def peek():
+        """The current snapshot without refreshing it, or None before the first build."""
+        return SnapshotService._current
+
+    @staticmethod
+    async def aget():
+        """Async get(): concurrent callers share one refresh, which runs in a
+        worker thread and trains models in the process pool."""
+        current = SnapshotService._current
+        if current is not None and SnapshotService.background:
+            return current
+        return await SnapshotService.flight.run(
+            "refresh",
+            lambda: run_in_thread(SnapshotService.refresh, train=train_in_pool)
+        )
+
+    @staticmethod
+    def refresh(force=False, warm=False, train=None):
+        """Rebuild the snapshot if the data changed and swap it in.
+
+        ``force`` revalidates the upstream payloads; ``warm`` also solves the
+        optimal squad and pre-renders the common responses before the new
+        snapshot is published; ``train`` is
+        passed on to ModelRegistry.get_models.
+        """
+        players, teams, fixtures, gw, version = FPLDataService.fetch_snapshot(force)
+        current = SnapshotService._current
+        if current is not None and current.version == version:
+            return current
+
+        with SnapshotService._lock:
+            current = SnapshotService._current
+            if current is not None and current.version == version:
+                return current
+
+            snapshot = SnapshotService.build(players, teams, fixtures, gw, version, train)
+            if warm:
+                snapshot.best_team()
+                snapshot.simulation()
+                snapshot.contributions()
+                snapshot.index()
+            SnapshotService.responses.clear()
+            if warm:
+                SnapshotService.responses.warm(snapshot)
+            SnapshotService._current = snapshot
+            SnapshotService.team_cache.clear()
+            SnapshotService.record_predictions(snapshot)
+            return snapshot
+
+    @staticmethod
+    def record_predictions(snapshot):
+        """Keep the served predictions for the upcoming gameweek in the history store until its deadline."""
+        frame = snapshot.table.frame
+        deadline = FPLDataService.deadline(snapshot.events, snapshot.gw)
+        try:
+            history.record_predictions(snapshot.gw, frame["id"].to_numpy(), frame["expected_points"].to_numpy(),
+                                       deadline)
+        except OSError:
+            logger.exception("Could not record predictions for gameweek %s", snapshot.gw)
+
+    @staticmethod
+    def build(players, teams, fixtures, gw, version, train=None):
+        events = FPLDataService.fetch_events()
+        fdr_map = FPLDataService.get_team_fdr(fixtures)
+        fdr_index = FPLDataService.get_fdr_index(fixtures)
+
+        season = len(GameweekTrainer.csv_paths())
+        native_models = None
+        if INFERENCE_ONLY:
+            models = ModelRegistry.stored_models()
+            model_kind = "gameweek" if GameweekTrainer.trained(models) else "season"
+        elif GameweekTrainer.available(history):
+            key = f"{version}-gw{history.actuals.rows}-s{season}"
+            native_models = ModelRegistry.get(key, GameweekTrainer.train,
+                                              (GameweekTrainer.csv_paths(), HISTORY_DIR, players, fixtures), train)
+            model_kind = "gameweek"
+        else:
+            native_models = ModelRegistry.get_models(players, fdr_map, gw, version, train)
+            model_kind = "season"
+        if native_models is not None:
+            models = ModelRegistry.compiled()
+
+        with timed("predict"):
+            if model_kind == "gameweek":
+                inputs = GameweekTrainer.prediction_inputs(models, history, players, fdr_index, gw, season)
+                expected = GameweekTrainer.predict_inputs(models, inputs, len(players))
+            else:
+                inputs = MLService.prediction_inputs(pd.DataFrame(players), fdr_map, models)
+                expected = np.round(MLService.predict_inputs(models, inputs, len(players)), 2)
+        table = PlayerTable.build(players, teams, fdr_map, models, expected)
+        return Snapshot(version, gw, players, teams, fixtures, events, fdr_map, fdr_index, models, table, inputs,
+                        model_kind, native_models)
@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import (
+    BASE_API_URL, SNAPSHOT_DIR, SNAPSHOT_TTL, SNAPSHOT_TIMEOUT, SNAPSHOT_OFFLINE
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    """TTL cache in front of the FPL API.
+
+    Payloads are revalidated with ETag/If-Modified-Since on a pooled session
+    and the last good copy of each endpoint is kept gzipped in ``cache_dir``.
+    Once a copy exists, reads never wait on the network: an expired entry is
+    served as-is while a background thread revalidates it, and upstream
+    failures keep serving the last good copy. With ``offline=True`` only the
+    files in ``cache_dir`` are used (plain ``.json`` recordings work too).
+    """
+
+    def __init__(self, base_url=BASE_API_URL, cache_dir=SNAPSHOT_DIR, ttl=SNAPSHOT_TTL,
+                 timeout=SNAPSHOT_TIMEOUT, offline=SNAPSHOT_OFFLINE):
+        self.base_url = base_url
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.offline = offline
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    # ------------------ Public API ------------------ #
+    def get_entry(self, endpoint, force=False):
+        """Return ``{"data", "digest", "etag", "last_modified", "checked_at"}``.
+
+        ``force`` revalidates synchronously regardless of the TTL.
+        """
+        entry = self._entries.get(endpoint)
+        if entry is None:
+            entry = self._load_disk(endpoint)
+            if entry is not None:
+                self._entries[endpoint] = entry
+
+        if self.offline:
+            if entry is None:
+                raise FileNotFoundError(f"No cached copy of '{endpoint}' in {self.cache_dir}")
+            return entry
+
+        if entry is None or force:
+            return self._refresh(endpoint, force=True)
+
+        if time.time() - entry["checked_at"] >= self.ttl:
+            self._refresh_in_background(endpoint)
+        return entry
+
+    def get(self, endpoint, force=False):
+        return self.get_entry(endpoint, force)["data"]
+
+    def fetch(self, endpoint):
+        """Uncached GET on the pooled session, for payloads read once.
+
+        In offline mode the file for ``endpoint`` in ``cache_dir`` is used.
+        """
+        if self.offline:
+            entry = self._load_disk(endpoint)
+            if entry is None:
+                raise FileNotFoundError(f"No cached copy of '{endpoint}' in {self.cache_dir}")
+            return entry["data"]
+        res = self.session.get(self.base_url + endpoint, timeout=self.timeout)
+        res.raise_for_status()
+        return res.json()
+
+    # ------------------ Revalidation ------------------ #
+    def _refresh_in_background(self, endpoint):
+        with self._lock:
+            if endpoint in self._refreshing:
+                return
+            self._refreshing.add(endpoint)
+
+        def run():
+            try:
+                self._refresh(endpoint)
+            except Exception:
+                logger.exception("Background refresh of %s failed; serving the stale copy", endpoint)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(endpoint)
+
+        threading.Thread(target=run, name=f"snapshot-refresh-{endpoint}", daemon=True).start()
+
+    def _refresh(self, endpoint, force=False):
+        with self._fetch_lock:
+            entry = self._entries.get(endpoint)
+            if entry is not None and not force and time.time() - entry["checked_at"] < self.ttl:
+                # Another caller revalidated it while we waited for the lock
+                return entry
+            try:
+                new_entry = self._fetch(endpoint, entry)
+            except (requests.RequestException, ValueError):
+                if entry is None:
+                    raise
+                return entry
+
+            self._entries[endpoint] = new_entry
+            return new_entry
+
+    def _fetch(self, endpoint, entry):
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        res = self.session.get(self.base_url + endpoint, headers=headers, timeout=self.timeout)
+        if res.status_code == 304 and entry is not None:
+            return dict(entry, checked_at=time.time())
+        res.raise_for_status()
+
+        data = res.json()
+        body = json.dumps(data, separators=(",", ":")).encode()
+        new_entry = {
+            "data": data,
+            "digest": hashlib.sha256(body).hexdigest(),
+            "etag": res.headers.get("ETag"),
+            "last_modified": res.headers.get("Last-Modified"),
+            "checked_at": time.time(),
+        }
+        self._save_disk(endpoint, body, new_entry)
+        return new_entry
+
+    # ------------------ Disk copies ------------------ #
+    def _base_path(self, endpoint):
+        return os.path.join(self.cache_dir, endpoint.strip("/").replace("/", "_"))
+
+    def _load_disk(self, endpoint):
+        base = self._base_path(endpoint)
+        try:
+            if os.path.exists(base + ".json.gz"):
+                with gzip.open(base + ".json.gz", "rb") as f:
+                    body = f.read()
+            else:
+                with open(base + ".json", "rb") as f:
+                    body = f.read()
+            data = json.loads(body)
+        except (OSError, ValueError):
+            return None
+
+        meta = {}
+        try:
+            with open(base + ".meta.json") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        return {
+            "data": data,
+            "digest": meta.get("digest") or hashlib.sha256(body).hexdigest(),
+            "etag": meta.get("etag"),
+            "last_modified": meta.get("last_modified"),
+            # Disk copies are always revalidated on first use
+            "checked_at": 0,
+        }
+
+    def _save_disk(self, endpoint, body, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        base = self._base_path(endpoint)
+        with gzip.open(base + ".json.gz.tmp", "wb", compresslevel=6) as f:
+            f.write(body)
+        os.replace(base + ".json.gz.tmp", base + ".json.gz")
+
+        meta = {k: entry[k] for k in ("digest", "etag", "last_modified")}
+        with open(base + ".meta.json.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(base + ".meta.json.tmp", base + ".meta.json")
@@ -0,0 +1,198 @@
+import logging
+import time
+
+import numpy as np
+
+from app.core.config import (
+    VALID_FORMATIONS, BENCH_WEIGHT, TRANSFER_HIT_COST, MAX_FREE_TRANSFERS,
+    PLANNER_POOL_SIZE, PLANNER_TIME_LIMIT, PLANNER_WARM_STARTS
+)
+from app.core.lazy import lazy_import
+from app.core.metrics import instrument
+from app.services.cache import LRUCache
+
+pulp = lazy_import("pulp")
+
+logger = logging.getLogger(__name__)
+
+
+class TransferPlanner:
+    """Rolling-horizon transfer planner.
+
+    Given a current 15-man squad, bank and free transfers it chooses the
+    transfers for each of the next ``horizon`` gameweeks, together with the XI
+    and captain, maximising expected points net of the -4 hits. Expected points
+    are scaled per gameweek by the team's fixtures (blank gameweeks score 0,
+    doubles count both matches). Selling price is taken as the current price.
+
+    The last solution for each of the PLANNER_WARM_STARTS most recently
+    planned squads is kept and passed to CBC as a warm start.
+    """
+    POS_LIMITS = {"GK": 2, "DEF": 5, "MID": 5, "FWD": 3}
+
+    def __init__(self, pool_size=PLANNER_POOL_SIZE, time_limit=PLANNER_TIME_LIMIT):
+        self.pool_size = pool_size
+        self.time_limit = time_limit
+        self._warm = LRUCache(PLANNER_WARM_STARTS)
+
+    @staticmethod
+    def _team_multipliers(multipliers, team_ids):
+        """Rows of the FDRIndex multiplier matrix for ``team_ids``; unknown teams get zeros."""
+        team_ids = np.asarray(team_ids, dtype=int)
+        out = np.zeros((len(team_ids), multipliers.shape[1]))
+        known = team_ids < len(multipliers)
+        out[known] = multipliers[team_ids[known]]
+        return out
+
+    def _pool(self, frame, squad_ids, multipliers):
+        """Current squad plus the best ``pool_size`` players per position over the horizon."""
+        horizon_ep = frame["expected_points"] * self._team_multipliers(multipliers, frame["team_id"]).sum(axis=1)
+        keep = set(squad_ids)
+        for pos in self.POS_LIMITS:
+            in_pos = horizon_ep[(frame["position"] == pos) & (frame["expected_points"] > 0)]
+            keep.update(in_pos.sort_values(ascending=False).index[:self.pool_size])
+        return frame.loc[[pid for pid in frame.index if pid in keep]]
+
+    @instrument("plan_transfers")
+    def plan(self, frame, fdr_index, start_gw, squad_ids, bank, free_transfers=1, horizon=3, time_limit=None):
+        """Plan transfers for ``horizon`` gameweeks from ``start_gw``.
+
+        ``frame`` is PlayerTable.frame and ``fdr_index`` the FDRIndex for the snapshot.
+        """
+        if start_gw is None:
+            raise ValueError("There is no upcoming gameweek to plan for")
+        squad_ids = list(dict.fromkeys(squad_ids))
+        missing = [pid for pid in squad_ids if pid not in frame.index]
+        if len(squad_ids) != 15 or missing:
+            raise ValueError(f"Squad must be 15 known player ids (unknown: {missing})")
+
+        gameweeks = list(range(start_gw, start_gw + horizon))
+        multipliers = fdr_index.multipliers(start_gw, horizon)
+        pool = self._pool(frame, squad_ids, multipliers)
+        ids = list(pool.index)
+        price = pool["price"].to_dict()
+        position = pool["position"].to_dict()
+        team = pool["team_id"].to_dict()
+        pool_ep = pool["expected_points"].to_numpy()[:, None] * self._team_multipliers(multipliers, pool["team_id"])
+        ep = {
+            (pid, gw): float(pool_ep[i, k])
+            for i, pid in enumerate(ids) for k, gw in enumerate(gameweeks)
+        }
+        owned = set(squad_ids)
+        budget = bank + sum(price[pid] for pid in squad_ids)
+
+        prob = pulp.LpProblem("FPL_Transfer_Plan", pulp.LpMaximize)
+        squad = pulp.LpVariable.dicts("squad", (ids, gameweeks), cat=pulp.LpBinary)
+        xi = pulp.LpVariable.dicts("xi", (ids, gameweeks), cat=pulp.LpBinary)
+        cap = pulp.LpVariable.dicts("cap", (ids, gameweeks), cat=pulp.LpBinary)
+        buy = pulp.LpVariable.dicts("buy", (ids, gameweeks), cat=pulp.LpBinary)
+        sell = pulp.LpVariable.dicts("sell", (ids, gameweeks), cat=pulp.LpBinary)
+        form = pulp.LpVariable.dicts("form", (range(len(VALID_FORMATIONS)), gameweeks), cat=pulp.LpBinary)
+        hits = pulp.LpVariable.dicts("hits", gameweeks, lowBound=0, cat=pulp.LpInteger)
+        ft = pulp.LpVariable.dicts("ft", gameweeks, lowBound=0, upBound=MAX_FREE_TRANSFERS, cat=pulp.LpInteger)
+        # 1 in gameweeks that pay hits, which must first use up every free transfer
+        over = pulp.LpVariable.dicts("over", gameweeks, cat=pulp.LpBinary)
+
+        by_pos = {pos: [pid for pid in ids if position[pid] == pos] for pos in self.POS_LIMITS}
+        by_team = {}
+        for pid in ids:
+            by_team.setdefault(team[pid], []).append(pid)
+
+        prob += (
+            pulp.lpSum(ep[pid, gw] * (xi[pid][gw] + cap[pid][gw]) + BENCH_WEIGHT * ep[pid, gw] * (squad[pid][gw] - xi[pid][gw])
+                  for pid in ids for gw in gameweeks)
+            - TRANSFER_HIT_COST * pulp.lpSum(hits[gw] for gw in gameweeks)
+        )
+
+        prob += ft[gameweeks[0]] == min(free_transfers, MAX_FREE_TRANSFERS)
+        for i, gw in enumerate(gameweeks):
+            for pid in ids:
+                before = (1 if pid in owned else 0) if i == 0 else squad[pid][gameweeks[i - 1]]
+                prob += squad[pid][gw] == before + buy[pid][gw] - sell[pid][gw]
+                prob += xi[pid][gw] <= squad[pid][gw]
+                prob += cap[pid][gw] <= xi[pid][gw]
+
+            prob += pulp.lpSum(squad[pid][gw] for pid in ids) == 15
+            prob += pulp.lpSum(price[pid] * squad[pid][gw] for pid in ids) <= budget
+            for pos, n in self.POS_LIMITS.items():
+                prob += pulp.lpSum(squad[pid][gw] for pid in by_pos[pos]) == n
+            for members in by_team.values():
+                prob += pulp.lpSum(squad[pid][gw] for pid in members) <= 3
+
+            prob += pulp.lpSum(xi[pid][gw] for pid in by_pos["GK"]) == 1
+            prob += pulp.lpSum(form[k][gw] for k in range(len(VALID_FORMATIONS))) == 1
+            for pos in ["DEF", "MID", "FWD"]:
+                prob += pulp.lpSum(xi[pid][gw] for pid in by_pos[pos]) == pulp.lpSum(
+                    f[pos] * form[k][gw] for k, f in enumerate(VALID_FORMATIONS))
+            prob += pulp.lpSum(cap[pid][gw] for pid in ids) == 1
+
+            # Transfers beyond the free ones cost a hit; unused free transfers roll over
+            transfers = pulp.lpSum(buy[pid][gw] for pid in ids)
+            prob += hits[gw] >= transfers - ft[gw]
+            prob += ft[gw] - transfers + hits[gw] >= 0
+            # A hit cannot be paid to bank a free transfer
+            prob += hits[gw] <= transfers
+            prob += hits[gw] <= 15 * over[gw]
+            prob += ft[gw] - transfers + hits[gw] <= MAX_FREE_TRANSFERS * (1 - over[gw])
+            if i + 1 < len(gameweeks):
+                prob += ft[gameweeks[i + 1]] <= ft[gw] - transfers + hits[gw] + 1
+
+        self._warm_start(tuple(sorted(squad_ids)), squad, ids, gameweeks, owned)
+
+        start = time.perf_counter()
+        limit = time_limit or self.time_limit
+        try:
+            prob.solve(pulp.PULP_CBC_CMD(msg=0, timeLimit=limit, warmStart=True))
+        except Exception:
+            prob.solve(pulp.GLPK_CMD(msg=0, timeLimit=limit))
+        solve_seconds = time.perf_counter() - start
+        logger.info("Transfer plan over %d gameweeks solved in %.3fs (%s)", horizon, solve_seconds,
+                    pulp.LpStatus[prob.status])
+
+        if squad[ids[0]][gameweeks[0]].varValue is None:
+            raise RuntimeError(f"No transfer plan found ({pulp.LpStatus[prob.status]})")
+
+        self._warm.put(tuple(sorted(squad_ids)), {
+            (pid, gw): round(squad[pid][gw].varValue) for pid in ids for gw in gameweeks
+        })
+
+        return {
+            "status": pulp.LpStatus[prob.status],
+            "solve_seconds": round(solve_seconds, 3),
+            "objective": round(prob.objective.value(), 2),
+            "plan": [
+                self._gameweek_plan(gw, pool, ids, squad, xi, cap, buy, sell, hits, ft, ep)
+                for gw in gameweeks
+            ],
+        }
+
+    def _warm_start(self, key, squad, ids, gameweeks, owned):
+        previous = self._warm.get(key, {})
+        for pid in ids:
+            for gw in gameweeks:
+                # Fall back to holding the current squad, which is always feasible
+                squad[pid][gw].setInitialValue(previous.get((pid, gw), 1 if pid in owned else 0))
+
+    @staticmethod
+    def _gameweek_plan(gw, pool, ids, squad, xi, cap, buy, sell, hits, ft, ep):
+        def picked(var):
+            return [pid for pid in ids if (var[pid][gw].varValue or 0) > 0.5]
+
+        def describe(pids):
+            return [{"id": pid, "name": pool.at[pid, "name"], "position": pool.at[pid, "position"],
+                     "team": pool.at[pid, "team"], "price": pool.at[pid, "price"]} for pid in pids]
+
+        starting = picked(xi)
+        captain = picked(cap)
+        points = sum(ep[pid, gw] for pid in starting) + sum(ep[pid, gw] for pid in captain)
+        return {
+            "gameweek": gw,
+            "transfers_in": describe(picked(buy)),
+            "transfers_out": describe(picked(sell)),
+            "free_transfers": round(ft[gw].varValue or 0),
+            "hits": round(hits[gw].varValue or 0),
+            "starting_xi": describe(starting),
+            "bench": describe([pid for pid in picked(squad) if pid not in starting]),
+            "captain": describe(captain)[0] if captain else None,
+            "expected_points": round(points, 2),
+        }
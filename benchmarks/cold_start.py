@@ -0,0 +1,84 @@
+"""Cold start of the API process: import, startup hooks and first snapshot.
+
+Each run is a fresh interpreter, so nothing is cached in-process::
+
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --data-dir recordings --model-dir model_store
+
+Readiness is the time until ``main`` is imported and the startup hooks have
+run. With ``--data-dir`` the first snapshot is also built from recorded
+payloads, using the stored models in ``--model-dir``. Reports which heavy
+libraries were imported at each point.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY = ["pandas", "sklearn", "xgboost", "catboost", "pulp", "joblib"]
+
+PROBE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+asyncio.run(main.app.router.startup())
+ready = time.perf_counter()
+heavy = {heavy!r}
+result = {{
+    "import_ms": (imported - start) * 1000,
+    "ready_ms": (ready - start) * 1000,
+    "loaded_at_ready": [m for m in heavy if m in sys.modules],
+}}
+if {data_dir!r}:
+    from app.services.data_service import FPLDataService
+    from app.services.snapshot_service import SnapshotService
+    from app.services.snapshot_store import SnapshotStore
+    FPLDataService.store = SnapshotStore(cache_dir={data_dir!r}, offline=True)
+    SnapshotService.refresh()
+    result["first_snapshot_ms"] = (time.perf_counter() - start) * 1000
+    result["loaded_at_snapshot"] = [m for m in heavy if m in sys.modules]
+asyncio.run(main.app.router.shutdown())
+print(json.dumps(result))
+"""
+
+
+def run_once(data_dir, env):
+    code = PROBE.format(heavy=HEAVY, data_dir=data_dir)
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--data-dir", help="Recorded API payloads; also time the first snapshot")
+    parser.add_argument("--model-dir", help="Stored model artifacts (FPL_MODEL_DIR)")
+    parser.add_argument("--training", action="store_true", help="Measure the training mode instead of inference-only")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, FPL_REFRESH_SCHEDULER="0", FPL_INFERENCE_ONLY="0" if args.training else "1")
+    if args.model_dir:
+        env["FPL_MODEL_DIR"] = args.model_dir
+
+    runs = [run_once(args.data_dir, env) for _ in range(args.runs)]
+    summary = {}
+    for key in ("import_ms", "ready_ms", "first_snapshot_ms"):
+        values = [r[key] for r in runs if key in r]
+        if values:
+            summary[key] = {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+            print(f"{key:20} median {summary[key]['median']:8.1f} ms   max {summary[key]['max']:8.1f} ms")
+    print("loaded at ready:   ", ", ".join(runs[-1]["loaded_at_ready"]) or "-")
+    if "loaded_at_snapshot" in runs[-1]:
+        print("loaded at snapshot:", ", ".join(runs[-1]["loaded_at_snapshot"]) or "-")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
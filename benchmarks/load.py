@@ -0,0 +1,204 @@
+"""Concurrent load generator for a running API.
+
+Drives every endpoint in ``main.py`` from ``--concurrency`` client threads
+for ``--duration`` seconds and reports throughput and p50/p95/p99 latency
+per endpoint and overall::
+
+    python -m benchmarks.stub_api --data-dir recordings &
+    FPL_API_URL=http://127.0.0.1:8900/api/ uvicorn main:app --workers 4 &
+    python -m benchmarks.load --url http://127.0.0.1:8000 --concurrency 32 --duration 60
+
+Player ids for the parameterised endpoints come from ``/top``. With
+``--revalidate`` clients resend the last ETag they saw, like the polling
+``team.html`` page, so cached endpoints answer 304.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+
+import requests
+
+POSITION_SLOTS = {"GK": 2, "DEF": 5, "MID": 5, "FWD": 3}
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Scenario:
+    """The requests a client picks from, with relative weights."""
+
+    def __init__(self, squad, players):
+        squad_ids = ",".join(map(str, squad))
+        sampler = random.Random(0)
+        bulk = {"squads": [{"id": str(i), "player_ids": sampler.sample(players, 15)} for i in range(20)]}
+        # Managers holding the discovered squad with different budgets, transfer limits and risk
+        batch = {"managers": [
+            {"id": str(i), "squad": squad, "bank": sampler.choice([0.0, 0.5, 1.5]),
+             "max_transfers": sampler.choice([1, 2, None]), "risk": sampler.choice(["safe", "neutral", "upside"])}
+            for i in range(10)
+        ]}
+        # name -> (weight, method, path or path(rng), json body)
+        self.requests = {
+            "/health": (1, "GET", "/health", None),
+            "/metrics": (1, "GET", "/metrics", None),
+            "/top": (8, "GET", "/top", None),
+            "/top?position": (4, "GET", lambda rng: f"/top?position={rng.choice(list(POSITION_SLOTS))}&n=10", None),
+            "/top?filtered": (2, "GET", lambda rng: f"/top?position={rng.choice(list(POSITION_SLOTS))}"
+                              f"&max_price={rng.choice([5.5, 7.5, 10.0])}&min_availability=0.75&sort=-value", None),
+            "/players": (2, "GET", "/players?q=position:MID price:<=7.5 sort:-value limit:10", None),
+            "/team": (8, "GET", "/team", None),
+            "/team?risk": (2, "GET", lambda rng: f"/team?risk={rng.choice(['safe', 'upside'])}", None),
+            "/team?budget": (2, "GET", lambda rng: f"/team?budget={rng.choice([95.0, 97.5, 99.0])}", None),
+            "/team/transfers": (1, "GET", f"/team/transfers?squad={squad_ids}&bank=1.0&horizon=3", None),
+            "/player/impact": (4, "GET", lambda rng: f"/player/impact?player_id={rng.choice(players)}", None),
+            "/player/performance-trends": (2, "GET", lambda rng: "/player/performance-trends?player_id="
+                                           f"{rng.choice(players)}", None),
+            "/team/risk": (3, "GET", f"/team/risk?team_ids={squad_ids}", None),
+            "/team/impact-summary": (3, "GET", f"/team/impact-summary?team_ids={squad_ids}", None),
+            "/team/risk/bulk": (1, "POST", "/team/risk/bulk", bulk),
+            "/team/impact-summary/bulk": (1, "POST", "/team/impact-summary/bulk", bulk),
+            "/team/batch": (1, "POST", "/team/batch", batch),
+            "/chat": (2, "POST", "/chat", {"message": "Show me the top 10 midfielders under 7.5m"}),
+        }
+
+    @staticmethod
+    def discover(url, timeout):
+        """Squad and player pool from /top: the first players of each position."""
+        res = requests.get(url + "/top", params={"n": 20}, timeout=timeout)
+        res.raise_for_status()
+        top = res.json()["top_players"]
+        squad = [p["id"] for pos, n in POSITION_SLOTS.items() for p in top[pos][:n]]
+        players = [p["id"] for ps in top.values() for p in ps]
+        return Scenario(squad, players)
+
+    def only(self, names):
+        unknown = set(names) - set(self.requests)
+        if unknown:
+            raise SystemExit(f"Unknown endpoints {sorted(unknown)}; choose from {list(self.requests)}")
+        self.requests = {name: self.requests[name] for name in names}
+
+    def pick(self, rng):
+        names = list(self.requests)
+        name = rng.choices(names, weights=[self.requests[n][0] for n in names])[0]
+        _, method, path, body = self.requests[name]
+        return name, method, path(rng) if callable(path) else path, body
+
+
+class LoadRun:
+    def __init__(self, url, scenario, concurrency, duration, timeout, revalidate):
+        self.url = url
+        self.scenario = scenario
+        self.concurrency = concurrency
+        self.duration = duration
+        self.timeout = timeout
+        self.revalidate = revalidate
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def _client(self, seed, deadline):
+        rng = random.Random(seed)
+        session = requests.Session()
+        etags = {}
+        samples = {}
+        while time.perf_counter() < deadline:
+            name, method, path, body = self.scenario.pick(rng)
+            headers = {"If-None-Match": etags[path]} if self.revalidate and path in etags else {}
+            start = time.perf_counter()
+            try:
+                res = session.request(method, self.url + path, json=body, headers=headers, timeout=self.timeout)
+                res.content  # read the body so the transfer is timed
+                status = res.status_code
+                if res.headers.get("ETag"):
+                    etags[path] = res.headers["ETag"]
+            except requests.RequestException:
+                status = None
+            samples.setdefault(name, []).append(((time.perf_counter() - start) * 1000, status))
+        with self._lock:
+            for name, values in samples.items():
+                self.samples.setdefault(name, []).extend(values)
+
+    def run(self):
+        start = time.perf_counter()
+        deadline = start + self.duration
+        threads = [threading.Thread(target=self._client, args=(i, deadline), daemon=True)
+                   for i in range(self.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.report(time.perf_counter() - start)
+
+    def report(self, elapsed):
+        def summary(values):
+            latencies = sorted(ms for ms, _ in values)
+            statuses = {}
+            for _, status in values:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            errors = sum(1 for _, status in values if status is None or status >= 400)
+            return {
+                "requests": len(values),
+                "errors": errors,
+                "not_modified": statuses.get("304", 0),
+                "rps": round(len(values) / elapsed, 2),
+                **{f"p{q}_ms": round(percentile(latencies, q), 2) for q in (50, 95, 99)},
+                "max_ms": round(latencies[-1], 2),
+                "statuses": statuses,
+            }
+
+        endpoints = {name: summary(values) for name, values in sorted(self.samples.items())}
+        everything = [v for values in self.samples.values() for v in values]
+        return {
+            "concurrency": self.concurrency,
+            "seconds": round(elapsed, 2),
+            "overall": summary(everything) if everything else None,
+            "endpoints": endpoints,
+        }
+
+
+def print_report(report):
+    print(f"{'endpoint':30} {'reqs':>7} {'err':>5} {'304':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, s in rows:
+        if s is None:
+            continue
+        print(f"{name:30} {s['requests']:7} {s['errors']:5} {s['not_modified']:5} {s['rps']:8.1f} "
+              f"{s['p50_ms']:9.2f} {s['p95_ms']:9.2f} {s['p99_ms']:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load after the warm-up")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of load that are not reported")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--revalidate", action="store_true", help="Send If-None-Match with the last ETag seen")
+    parser.add_argument("--endpoints", help="Comma-separated endpoint names to drive (default: all)")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/")
+    scenario = Scenario.discover(url, args.timeout)
+    if args.endpoints:
+        scenario.only([x.strip() for x in args.endpoints.split(",") if x.strip()])
+
+    if args.warmup > 0:
+        LoadRun(url, scenario, args.concurrency, args.warmup, args.timeout, args.revalidate).run()
+    report = LoadRun(url, scenario, args.concurrency, args.duration, args.timeout, args.revalidate).run()
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Solve time of the transfer planner against horizon length.
+
+Runs against recorded ``bootstrap-static.json`` and ``fixtures.json`` files
+(the snapshot cache layout) so no network is needed::
+
+    python -m benchmarks.planner_horizon --data-dir recordings --max-horizon 6
+"""
+import argparse
+import json
+import time
+
+from app.services.data_service import FPLDataService
+from app.services.snapshot_service import SnapshotService
+from app.services.snapshot_store import SnapshotStore
+from app.services.transfer_planner import TransferPlanner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", required=True, help="Directory with recorded API payloads")
+    parser.add_argument("--max-horizon", type=int, default=6)
+    parser.add_argument("--time-limit", type=int, default=60)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    FPLDataService.store = SnapshotStore(cache_dir=args.data_dir, offline=True)
+    snapshot = SnapshotService.refresh()
+    team = snapshot.best_team()
+    squad_ids = [p["id"] for group in (team["starting_xi"], team["bench"]) for ps in group.values() for p in ps]
+
+    results = []
+    for horizon in range(1, args.max_horizon + 1):
+        for warm in (False, True):
+            planner = TransferPlanner(time_limit=args.time_limit)
+            if warm:
+                planner.plan(snapshot.table.frame, snapshot.fdr_index, snapshot.gw, squad_ids, 0.0, 1, horizon)
+            start = time.perf_counter()
+            plan = planner.plan(snapshot.table.frame, snapshot.fdr_index, snapshot.gw, squad_ids, 0.0, 1, horizon)
+            seconds = time.perf_counter() - start
+            results.append({"horizon": horizon, "warm_start": warm, "seconds": round(seconds, 3),
+                            "status": plan["status"], "objective": plan["objective"]})
+            print(f"horizon={horizon} warm={warm!s:5} {seconds:8.3f}s {plan['status']} {plan['objective']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Benchmark the request pipeline against recorded FPL payloads.
+
+Record the payloads once, then benchmark offline::
+
+    python -m benchmarks.run record --data-dir recordings
+    python -m benchmarks.run run --data-dir recordings --baseline benchmarks/results/last.json
+
+Every stage (fetch, FDR, training per estimator, prediction, enrichment,
+optimisation) and every endpoint end-to-end is timed cold (all caches
+cleared) and warm (repeated with caches populated). Results are written as
+JSON to ``--output-dir``; with ``--baseline`` stages slower than
+``--threshold`` times the baseline are reported and the exit code is 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+
+import main
+from app.core.config import TOTAL_BUDGET, MAX_PER_CLUB
+from app.services import executors, model_registry, model_selection, snapshot_service
+from app.services.batch_optimizer import BatchOptimizer
+from app.services.data_service import FPLDataService
+from app.services.compiled_model import ModelCompiler
+from app.services.explainer import Explainer
+from app.services.fdr_index import FDRIndex
+from app.services.history_store import HistoryStore
+from app.services.ml_service import MLService
+from app.services.model_registry import ModelRegistry
+from app.services.optimizer_service import OptimizerService, SquadModel
+from app.services.player_query import PlayerIndex, PlayerQuery
+from app.services.player_table import PlayerTable
+from app.services.simulation import PointsSimulator
+from app.services.snapshot_service import SnapshotService
+from app.services.snapshot_store import SnapshotStore
+
+ENDPOINTS = {
+    "/top": lambda: _top(n=5),
+    "/top?n=10": lambda: _top(n=10),
+    "/top?filtered": lambda: _top(n=10, position="MID", max_price=7.5, min_availability=0.75, sort="-value"),
+    "/players": lambda: main.find_players(request=_request(), q="position:DEF price:4-5.5 sort:-value limit:10"),
+    "/team": lambda: main.build_team(request=_request(), budget=TOTAL_BUDGET, locked=None, excluded=None,
+                                     max_per_club=MAX_PER_CLUB, formations=None, risk="neutral"),
+    "/player/impact": lambda: main.player_impact(player_id=_sample_player_id()),
+    "/player/performance-trends": lambda: main.player_performance_trends(player_id=_sample_player_id(),
+                                                                                 n_gameweeks=5),
+    "/team/risk": lambda: main.team_risk(team_ids=_sample_squad()),
+    "/team/impact-summary": lambda: main.team_impact_summary(team_ids=_sample_squad()),
+    "/team/batch": lambda: main.batch_teams(body=_sample_managers(50)),
+}
+
+
+def _top(n, position=None, team=None, min_price=None, max_price=None, min_availability=None,
+         penalty_taker=None, sort="expected_points"):
+    return main.top_players(request=_request(), n=n, position=position, team=team, min_price=min_price,
+                            max_price=max_price, min_availability=min_availability,
+                            penalty_taker=penalty_taker, sort=sort)
+
+
+def _request(headers=((b"accept-encoding", b"gzip, br"),)):
+    return Request({"type": "http", "method": "GET", "headers": list(headers)})
+
+
+async def _drain(iterator):
+    return b"".join([chunk if isinstance(chunk, bytes) else chunk.encode() async for chunk in iterator])
+
+
+def _call_endpoint(call):
+    result = asyncio.run(call())
+    if isinstance(result, StreamingResponse):
+        return asyncio.run(_drain(result.body_iterator))
+    if isinstance(result, Response):
+        return result.body
+    return json.dumps(jsonable_encoder(result))
+
+
+def _sample_player_id():
+    return SnapshotService.get().table.candidates[0]["id"]
+
+
+def _sample_squad():
+    return ",".join(str(p["id"]) for p in SnapshotService.get().table.candidates[:15])
+
+
+def _sample_managers(n):
+    """Managers holding the sample squad with different banks and transfer limits."""
+    squad = [int(x) for x in _sample_squad().split(",")]
+    return main.BatchManagers(managers=[
+        main.ManagerState(id=str(i), squad=squad, bank=(i % 10) * 0.5, max_transfers=i % 4)
+        for i in range(n)
+    ])
+
+
+def _measure(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times, result
+
+
+def _summary(times):
+    return {
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "max_ms": round(max(times), 3),
+        "runs": len(times),
+    }
+
+
+class Pipeline:
+    """Runs each stage with explicit cold/warm control over the caches."""
+
+    def __init__(self, data_dir, repeat):
+        self.data_dir = data_dir
+        self.repeat = repeat
+        self.results = {}
+        self._model_dir = tempfile.mkdtemp(prefix="fpl-bench-models-")
+        # Also seen by spawned training workers
+        os.environ["FPL_SELECTION_CACHE_DIR"] = os.path.join(self._model_dir, "selection")
+
+    def reset(self):
+        FPLDataService.store = SnapshotStore(cache_dir=self.data_dir, offline=True)
+        FPLDataService.fdr_index = FDRIndex()
+        SnapshotService._current = None
+        SnapshotService.team_cache.clear()
+        SnapshotService.responses.clear()
+        ModelRegistry._key = None
+        ModelRegistry._models = None
+        ModelRegistry._compiled_key = None
+        ModelRegistry._compiled = None
+        shutil.rmtree(self._model_dir, ignore_errors=True)
+        model_registry.MODEL_REGISTRY_DIR = self._model_dir
+        model_selection.SELECTION_CACHE_DIR = os.path.join(self._model_dir, "selection")
+        # Keep served predictions out of the real HISTORY_DIR
+        snapshot_service.history = main.history = HistoryStore(os.path.join(self._model_dir, "history"))
+
+    def record(self, name, fn, warm_fn=None):
+        self.reset()
+        cold, result = _measure(fn, 1)
+        warm, _ = _measure(warm_fn or fn, self.repeat)
+        self.results[name] = {"cold_ms": round(cold[0], 3), "warm": _summary(warm)}
+        print(f"{name:45} cold {cold[0]:10.2f} ms   warm median {self.results[name]['warm']['median_ms']:10.2f} ms")
+        return result
+
+    def run(self):
+        players, teams, fixtures, gw, version = self.record(
+            "stage.fetch", lambda: FPLDataService.fetch_snapshot())
+        fdr_map = self.record("stage.get_team_fdr", lambda: FPLDataService.get_team_fdr(fixtures))
+        fdr_index = self.record("stage.fdr_index_build", lambda: FDRIndex.from_fixtures(fixtures))
+        self.record("stage.fdr_window_next5", lambda: fdr_index.window(gw or 1, 5))
+
+        models = self.record("stage.train_models", lambda: MLService.train_models(players, fdr_map))
+        fit_ms = {}
+        for item in MLService.last_training_report:
+            name = f"stage.train.{item['position']}.{item['model']}"
+            fit_ms[name] = fit_ms.get(name, 0) + item["seconds"] * 1000
+        for name, ms in fit_ms.items():
+            self.results[name] = {"fit_ms": round(ms, 3)}
+        self.record("stage.model_registry",
+                    lambda: ModelRegistry.get_models(players, fdr_map, gw, version))
+
+        players_df = pd.DataFrame(players)
+        self.record("stage.predict_points_loop",
+                    lambda: [MLService.predict_points(dict(p), fdr_map, models) for p in players])
+        self.record("stage.predict_batch", lambda: MLService.predict_batch(players_df, fdr_map, models))
+        inputs = MLService.prediction_inputs(players_df, fdr_map, models)
+        compiled = self.record("stage.compile_models", lambda: ModelCompiler.compile_all(models))
+        self.record("stage.predict_native", lambda: MLService.predict_inputs(models, inputs, len(players)))
+        self.record("stage.predict_compiled", lambda: MLService.predict_inputs(compiled, inputs, len(players)))
+        self.record("stage.explain", lambda: Explainer.explain(models, inputs, len(players)))
+        table = self.record("stage.enrich", lambda: PlayerTable.build(players, teams, fdr_map, models))
+        self.record("stage.simulate_points", lambda: PointsSimulator.simulate(table.frame, fdr_map, gw))
+        index = self.record("stage.player_index.build", lambda: PlayerIndex(table, teams))
+        queries = [PlayerQuery(limit=5), PlayerQuery("MID", max_price=7.5, min_availability=0.75, limit=10),
+                   PlayerQuery("DEF", min_price=4.0, max_price=5.5, sort="value", limit=10),
+                   PlayerQuery(penalty_taker=True, sort="total_points", limit=20)]
+        self.record("stage.player_index.query", lambda: [index.query(q) for q in queries])
+        self.record("stage.player_index.parse_message",
+                    lambda: index.messages.parse("top 10 fit midfielders under 7.5m by value"))
+
+        self.record("stage.optimize_team_legacy", lambda: OptimizerService.pick_xi(
+            OptimizerService.optimize_team(table.candidates)))
+        model = SquadModel(table.candidates)
+        self.record("stage.squad_model.build", lambda: SquadModel(table.candidates))
+        self.record("stage.squad_model.solve", lambda: SquadModel(table.candidates).solve(), model.solve)
+
+        for path, call in ENDPOINTS.items():
+            self.record(f"endpoint.{path}", lambda call=call: _call_endpoint(call))
+
+        executors.shutdown()
+        BatchOptimizer.cleanup()
+        shutil.rmtree(self._model_dir, ignore_errors=True)
+        return self.results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or "warm" not in current or "warm" not in before:
+            continue
+        ratio = current["warm"]["median_ms"] / max(before["warm"]["median_ms"], 1e-6)
+        if ratio > threshold:
+            regressions.append((name, before["warm"]["median_ms"], current["warm"]["median_ms"], ratio))
+
+    for name, before, after, ratio in regressions:
+        print(f"REGRESSION {name}: {before:.2f} ms -> {after:.2f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def record_payloads(data_dir, element_summaries=0):
+    """Save the snapshot payloads and, for the ``element_summaries`` highest
+    scoring players, their ``element-summary`` payloads (named like
+    SnapshotStore's disk copies, so offline stores and stub_api read them)."""
+    os.makedirs(data_dir, exist_ok=True)
+    store = SnapshotStore(cache_dir=tempfile.mkdtemp(prefix="fpl-bench-record-"))
+
+    def save(endpoint, data):
+        with open(os.path.join(data_dir, endpoint.strip("/").replace("/", "_") + ".json"), "w") as f:
+            json.dump(data, f)
+        print(f"Recorded {endpoint} -> {data_dir}")
+
+    for endpoint in ("bootstrap-static/", "fixtures/"):
+        save(endpoint, store.get(endpoint, force=True))
+    players = sorted(store.get("bootstrap-static/")["elements"], key=lambda p: -p["total_points"])
+    for player in players[:element_summaries]:
+        endpoint = f"element-summary/{player['id']}/"
+        save(endpoint, store.fetch(endpoint))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="FPL pipeline benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="Record live API payloads for offline runs")
+    rec.add_argument("--data-dir", required=True)
+    rec.add_argument("--element-summaries", type=int, default=0,
+                     help="Also record element-summary for this many top scorers")
+
+    run = sub.add_parser("run", help="Run the benchmarks against recorded payloads")
+    run.add_argument("--data-dir", required=True)
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--output-dir", default=os.path.join("benchmarks", "results"))
+    run.add_argument("--baseline", help="Previous results file to compare against")
+    run.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_payloads(args.data_dir, args.element_summaries)
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = Pipeline(args.data_dir, args.repeat).run()
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    for name in (f"{stamp}.json", "last.json"):
+        with open(os.path.join(args.output_dir, name), "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Results written to {args.output_dir}/{stamp}.json")
+
+    if baseline and compare(results, baseline, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
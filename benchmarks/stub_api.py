@@ -0,0 +1,169 @@
+"""Local stand-in for the FPL API that replays recorded payloads.
+
+Record once, then point the app at the stub instead of the live API::
+
+    python -m benchmarks.run record --data-dir recordings --element-summaries 50
+    python -m benchmarks.stub_api --data-dir recordings --latency-ms 80 --jitter-ms 40 --error-rate 0.02
+    FPL_API_URL=http://127.0.0.1:8900/api/ uvicorn main:app
+
+``GET /api/{endpoint}`` serves the recording named like SnapshotStore's disk
+copies (``bootstrap-static.json``, ``element-summary_{id}.json``, optionally
+gzipped). Element summaries that were not recorded are answered with a
+recorded one unless ``--strict``. Responses carry an ETag and honour
+If-None-Match like the real API. Latency and errors can be changed while the
+stub runs::
+
+    curl -X POST localhost:8900/__stub__ -d '{"error_rate": 0.5, "error_status": 502}'
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SETTINGS = ("latency_ms", "jitter_ms", "error_rate", "error_status", "hang_rate", "hang_seconds")
+
+
+class Recordings:
+    """Recorded payloads by endpoint key, e.g. "bootstrap-static" or "element-summary_12"."""
+
+    def __init__(self, data_dir, strict=False):
+        self.strict = strict
+        self.bodies = {}
+        for name in sorted(os.listdir(data_dir)):
+            if name.endswith(".meta.json"):
+                continue
+            path = os.path.join(data_dir, name)
+            if name.endswith(".json.gz"):
+                with gzip.open(path, "rb") as f:
+                    body = f.read()
+                key = name[:-len(".json.gz")]
+            elif name.endswith(".json"):
+                with open(path, "rb") as f:
+                    body = f.read()
+                key = name[:-len(".json")]
+            else:
+                continue
+            self.bodies[key] = (body, '"%s"' % hashlib.sha256(body).hexdigest()[:32])
+        if not self.bodies:
+            raise SystemExit(f"No recorded payloads in {data_dir}")
+
+    def get(self, endpoint):
+        key = endpoint.strip("/").replace("/", "_")
+        found = self.bodies.get(key)
+        if found is None and not self.strict and key.startswith("element-summary_"):
+            summaries = sorted(k for k in self.bodies if k.startswith("element-summary_"))
+            if summaries:
+                found = self.bodies[summaries[zlib.crc32(key.encode()) % len(summaries)]]
+        return found
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "FPLStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        if not self.path.startswith("/api/"):
+            return self._send(404, b'{"detail":"Not found."}')
+        settings = self.server.current()
+        delay = (settings["latency_ms"] + random.uniform(0, settings["jitter_ms"])) / 1000
+        if random.random() < settings["hang_rate"]:
+            delay += settings["hang_seconds"]
+        if delay > 0:
+            time.sleep(delay)
+        if random.random() < settings["error_rate"]:
+            return self._send(settings["error_status"], b'{"detail":"Injected error"}')
+
+        found = self.server.recordings.get(self.path[len("/api/"):].split("?")[0])
+        if found is None:
+            return self._send(404, b'{"detail":"Not found."}')
+        body, etag = found
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", etag)
+        self._send(200, body, etag)
+
+    def do_POST(self):
+        if self.path != "/__stub__":
+            return self._send(404, b'{"detail":"Not found."}')
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            changes = json.loads(self.rfile.read(length) or b"{}")
+            self.server.update(changes)
+        except (ValueError, TypeError) as e:
+            return self._send(400, json.dumps({"detail": str(e)}).encode())
+        self._send(200, json.dumps(self.server.current()).encode())
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, recordings, verbose=False, **settings):
+        super().__init__(address, StubHandler)
+        self.recordings = recordings
+        self.verbose = verbose
+        self._settings = {key: settings[key] for key in SETTINGS}
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            return dict(self._settings)
+
+    def update(self, changes):
+        unknown = set(changes) - set(SETTINGS)
+        if unknown:
+            raise ValueError(f"Unknown settings {sorted(unknown)}; expected {list(SETTINGS)}")
+        with self._lock:
+            for key, value in changes.items():
+                self._settings[key] = type(self._settings[key])(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", required=True, help="Recorded payloads (benchmarks.run record)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Extra uniform random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--hang-rate", type=float, default=0.0,
+                        help="Fraction of requests delayed by --hang-seconds, e.g. past the client timeout")
+    parser.add_argument("--hang-seconds", type=float, default=15.0)
+    parser.add_argument("--strict", action="store_true", help="404 for element summaries that were not recorded")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    recordings = Recordings(args.data_dir, args.strict)
+    server = StubServer((args.host, args.port), recordings, args.verbose,
+                        **{key: getattr(args, key) for key in SETTINGS})
+    print(f"Serving {len(recordings.bodies)} recorded payloads on http://{args.host}:{args.port}/api/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
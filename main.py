@@ -1,312 +1,386 @@
+import json
+import logging
+import random
+import time
+
 from fastapi import FastAPI, Query, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 from typing import Optional, List
 
-from app.core.config import POSITIONS, BASE_IMAGE_URL
-from app.services.data_service import FPLDataService
-from app.services.ml_service import MLService
+from app.core.config import (
+    REFRESH_SCHEDULER_ENABLED, TOTAL_BUDGET, MAX_PER_CLUB, RISK_PROFILES,
+    SERVER_TIMING_ENABLED, PROFILE_SLOW_MS, PROFILE_SAMPLE_RATE, INFERENCE_ONLY
+)
+from app.core.metrics import (
+    REQUEST_SECONDS, StackSampler, timed, render_metrics, server_timing_header,
+    start_request_timings, end_request_timings
+)
+from app.services import executors
+from app.services.executors import run_in_thread
+from app.services.history_store import history
+from app.services.batch_optimizer import BatchOptimizer
+from app.services.model_registry import ModelRegistry
 from app.services.optimizer_service import OptimizerService
+from app.services.player_query import MessageParser, PlayerQuery
+from app.services.scheduler import RefreshScheduler
+from app.services.snapshot_service import SnapshotService
+from app.services.transfer_planner import TransferPlanner
+
+logger = logging.getLogger(__name__)
+
+
+class TimedJSONResponse(JSONResponse):
+    def render(self, content):
+        with timed("serialize"):
+            return super().render(content)
 
-app = FastAPI()
+
+app = FastAPI(default_response_class=TimedJSONResponse)
 app.mount("/static", StaticFiles(directory="static"), name="static")
+scheduler = RefreshScheduler()
+planner = TransferPlanner()
+responses = SnapshotService.responses
+
+
+@app.on_event("startup")
+def load_models():
+    # Inference-only replicas load the stored artifact with the first snapshot,
+    # off the startup path
+    if not INFERENCE_ONLY:
+        ModelRegistry.load_latest()
+
+
+@app.on_event("startup")
+async def start_scheduler():
+    if REFRESH_SCHEDULER_ENABLED:
+        scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await scheduler.stop()
+    executors.shutdown()
+    BatchOptimizer.cleanup()
+
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Record request latency, add Server-Timing and profile slow requests."""
+    sampler = None
+    if PROFILE_SLOW_MS and random.random() < PROFILE_SAMPLE_RATE:
+        sampler = StackSampler()
+        sampler.start()
+
+    timings, token = start_request_timings()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        end_request_timings(token)
+        if sampler is not None:
+            sampler.stop()
+    elapsed = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    # Unmatched paths share one label so 404 scans cannot grow the label sets
+    path = route.path if route is not None else "<unmatched>"
+    REQUEST_SECONDS.observe(elapsed, method=request.method, path=path, status=response.status_code)
+
+    if SERVER_TIMING_ENABLED or request.headers.get("x-server-timing") == "1":
+        response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    if sampler is not None and elapsed * 1000 >= PROFILE_SLOW_MS:
+        logger.warning("Slow request %s %s took %.0f ms; stages %s\n%s", request.method, path, elapsed * 1000,
+                       server_timing_header(timings, elapsed), sampler.report())
+    return response
+
+
+@app.get("/health", include_in_schema=False)
+def health():
+    """Readiness probe; never waits for data or models."""
+    current = SnapshotService._current
+    return {"status": "ok", "snapshot": current.version if current is not None else None}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/top")
-def top_players(
-    n: int = Query(5, gt=0, description="Number of top players per position"),
-    position: Optional[str] = Query(None, description="Position filter: GK, DEF, MID, FWD")
+async def top_players(
+    request: Request,
+    n: int = Query(5, gt=0, le=PlayerQuery.MAX_LIMIT, description="Number of top players per position"),
+    position: Optional[str] = Query(None, description="Position filter: GK, DEF, MID, FWD"),
+    team: Optional[str] = Query(None, description="Team name or short name, e.g. 'Arsenal' or 'ARS'"),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price in millions"),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price in millions"),
+    min_availability: Optional[float] = Query(None, ge=0, le=1, description="Minimum chance of playing, 0-1"),
+    penalty_taker: Optional[bool] = Query(None, description="Only (or no) penalty takers"),
+    sort: str = Query("expected_points", description=f"Sort key, '-'/'+' prefixed to force the order: "
+                                                     f"{', '.join(PlayerQuery.SORT_KEYS)}"),
 ):
     position = position.upper() if position else None
     valid_positions = ["GK", "DEF", "MID", "FWD"]
     if position and position not in valid_positions:
         return {"error": f"Invalid position '{position}'. Must be one of {valid_positions}"}
 
-    players, teams, fixtures, gw = FPLDataService.fetch_fpl_data()
-    team_map = {t["id"]: t["name"] for t in teams}
-    fdr_map = FPLDataService.get_team_fdr(fixtures)
-
-    models = MLService.train_models(players, fdr_map)
-
-    enriched = []
-    for p in players:
-        pos_map = {1: "GK", 2: "DEF", 3: "MID", 4: "FWD"}
-        pos = pos_map.get(p.get("element_type"), "UNK")
-
-        # Only MID/FWD get penalty/set-piece
-        if pos in ["MID", "FWD"]:
-            p["penalty_taker"] = 1 if p.get("penalties_order") else 0
-            p["set_piece_taker"] = 1 if (p.get("corners_and_indirect_freekicks_order") or
-                                         p.get("direct_freekicks_order")) else 0
-        else:
-            p["penalty_taker"] = 0
-            p["set_piece_taker"] = 0
-
-        # Common features
-        p["yellow_cards"] = p.get("yellow_cards", 0)
-        p["red_cards"] = p.get("red_cards", 0)
-        p["availability"] = (p.get("chance_of_playing_next_round", 100) or 100) / 100
-
-        ep = MLService.predict_points(p, fdr_map, models)
-        if ep <= 0:
-            continue
-
-        enriched.append({
-            "name": f"{p['first_name']} {p['second_name']}",
-            "team": team_map[p["team"]],
-            "position": POSITIONS[p["element_type"]],
-            "price": p["now_cost"] / 10,
-            "expected_points": ep,
-            "minutes": p.get("minutes", 0),
-            "chance": p.get("chance_of_playing_next_round", 100),
-            "penalty_taker": p["penalty_taker"],
-            "set_piece_taker": p["set_piece_taker"],
-            "yellow_cards": p["yellow_cards"],
-            "red_cards": p["red_cards"],
-            "availability": p["availability"],
-            "image": BASE_IMAGE_URL + p.get("photo", "")
-        })
-
-    positions_to_return = [position] if position else valid_positions
-    top_n = {}
-    for pos in positions_to_return:
-        pos_players = [p for p in enriched if p["position"] == pos]
-        sorted_players = sorted(pos_players, key=lambda x: x["expected_points"], reverse=True)[:n]
-        top_n[pos] = sorted_players
+    snapshot = await SnapshotService.aget()
+    try:
+        sort, descending = PlayerQuery.sort_order(sort)
+        query = PlayerQuery(None, snapshot.index().team(team) if team else None, min_price, max_price,
+                            min_availability, penalty_taker, sort, descending, n)
+    except ValueError as e:
+        return {"error": str(e)}
+    key = ("top", position, query.text())
+    rendered = responses.get(snapshot.version, key)
+    if rendered is None:
+        rendered = responses.put(snapshot.version, key, top_payload(snapshot, query, position))
+    return rendered.response(request)
+
+
+def top_payload(snapshot, query, position):
+    positions_to_return = [position] if position else ["GK", "DEF", "MID", "FWD"]
+    index = snapshot.index()
+    top_n = {pos: index.query(query.for_position(pos)) for pos in positions_to_return}
 
     return {
-        "gameweek": gw,
+        "gameweek": snapshot.gw,
         "top_players": top_n
     }
 
 
-@app.get("/team")
-def build_team():
-    players, teams, fixtures, gw = FPLDataService.fetch_fpl_data()
-    team_map = {t["id"]: t["name"] for t in teams}
-    fdr_map = FPLDataService.get_team_fdr(fixtures)
-
-    models = MLService.train_models(players, fdr_map)
-
-    enriched = []
-    for p in players:
-        pos_map = {1: "GK", 2: "DEF", 3: "MID", 4: "FWD"}
-        pos = pos_map.get(p.get("element_type"), "UNK")
-
-        # Only MID/FWD get penalty/set-piece
-        if pos in ["MID", "FWD"]:
-            p["penalty_taker"] = 1 if p.get("penalties_order") else 0
-            p["set_piece_taker"] = 1 if (p.get("corners_and_indirect_freekicks_order") or
-                                         p.get("direct_freekicks_order")) else 0
-        else:
-            p["penalty_taker"] = 0
-            p["set_piece_taker"] = 0
-
-        # Common features
-        p["yellow_cards"] = p.get("yellow_cards", 0)
-        p["red_cards"] = p.get("red_cards", 0)
-        p["availability"] = (p.get("chance_of_playing_next_round", 100) or 100) / 100
-
-        ep = MLService.predict_points(p, fdr_map, models)
-        if ep <= 0:
-            continue
-
-        pos_name = pos_map.get(p.get("element_type"), "UNK")
-        model_name = models[pos_name][2] if pos_name in models else "Unknown"
-
-
-        enriched.append({
-            "name": f"{p['first_name']} {p['second_name']}",
-            "team": team_map[p["team"]],
-            "position": POSITIONS[p["element_type"]],
-            "price": p["now_cost"] / 10,
-            "expected_points": ep,
-            "minutes": p.get("minutes", 0),
-            "chance": p.get("chance_of_playing_next_round", 100),
-            "penalty_taker": p["penalty_taker"],
-            "set_piece_taker": p["set_piece_taker"],
-            "yellow_cards": p["yellow_cards"],
-            "red_cards": p["red_cards"],
-            "availability": p["availability"],
-            "model_used": model_name
-           
+@app.get("/players")
+async def find_players(
+    request: Request,
+    q: str = Query("", description="Player query, e.g. 'position:MID team:ARS price:<=7.5 sort:-value limit:10'"),
+):
+    snapshot = await SnapshotService.aget()
+    try:
+        query = PlayerQuery.parse(q)
+        if query.team is not None:
+            query.team = snapshot.index().team(query.team)
+    except ValueError as e:
+        return {"error": str(e)}
+    key = ("players", query.text())
+    rendered = responses.get(snapshot.version, key)
+    if rendered is None:
+        rendered = responses.put(snapshot.version, key, {
+            "gameweek": snapshot.gw,
+            "query": query.text(),
+            "players": snapshot.index().query(query),
         })
+    return rendered.response(request)
 
-    optimizer = OptimizerService()
-    squad = optimizer.optimize_team(enriched)
-    xi, bench, formation, xi_points = optimizer.pick_xi(squad)
-    captain, vice = optimizer.pick_captain(xi)
-    bench_points = sum(p["expected_points"] for p in bench)
 
-    if captain:
-        xi_points += captain["expected_points"]
+def parse_ids(value):
+    return [int(x) for x in value.split(",") if x.strip()] if value else []
 
-    return {
-        "gameweek": gw,
-        "starting_formation": formation,
-        "starting_xi": optimizer.group_pos(xi),
-        "bench": optimizer.group_pos(bench),
-        "captain": captain,
-        "vice_captain": vice,
-        "starting_xi_points": xi_points,
-        "bench_points": bench_points,
-        "total_team_cost": sum(p["price"] for p in squad)
-    }
+
+@app.get("/team")
+async def build_team(
+    request: Request,
+    budget: float = Query(TOTAL_BUDGET, gt=0, description="Squad budget in millions"),
+    locked: Optional[str] = Query(None, description="Comma-separated player IDs that must be in the squad"),
+    excluded: Optional[str] = Query(None, description="Comma-separated player IDs to leave out"),
+    max_per_club: int = Query(MAX_PER_CLUB, ge=1, le=15, description="Maximum players from one club"),
+    formations: Optional[str] = Query(None, description="Allowed formations, e.g. '4-4-2,3-5-2'"),
+    risk: str = Query("neutral", description=f"Risk profile: {', '.join(RISK_PROFILES)}"),
+):
+    if risk not in RISK_PROFILES:
+        return {"error": f"Invalid risk profile '{risk}'. Must be one of {list(RISK_PROFILES)}"}
+    allowed = None
+    if formations:
+        try:
+            allowed = OptimizerService.formation_indices([x.strip() for x in formations.split(",") if x.strip()])
+        except ValueError as e:
+            return {"error": str(e)}
+
+    snapshot = await SnapshotService.aget()
+    try:
+        args = (budget, parse_ids(locked), parse_ids(excluded), max_per_club, allowed)
+        key = ("team", risk, snapshot.team_constraints(*args))
+        rendered = responses.get(snapshot.version, key)
+        if rendered is None:
+            team = await snapshot.ateam(*args, risk=risk)
+            payload = await run_in_thread(team_payload, snapshot, team, risk)
+            rendered = responses.put(snapshot.version, key, payload)
+    except ValueError as e:
+        return {"error": str(e)}
+    return rendered.response(request)
+
+
+def team_payload(snapshot, team, risk):
+    return {"gameweek": snapshot.gw, "risk_profile": risk, **team, **snapshot.team_distribution(team)}
+
+
+@responses.warmer
+def prerender_common(snapshot):
+    """Default /top views and the default /team squad, rendered before a snapshot goes live."""
+    query = PlayerQuery(limit=5)
+    for position in (None, "GK", "DEF", "MID", "FWD"):
+        responses.put(snapshot.version, ("top", position, query.text()), top_payload(snapshot, query, position))
+    responses.put(snapshot.version, ("team", "neutral", None), team_payload(snapshot, snapshot.best_team(), "neutral"))
+
+@app.get("/team/transfers")
+async def plan_transfers(
+    squad: str = Query(..., description="Comma-separated list of the 15 current player IDs"),
+    bank: float = Query(0.0, ge=0, description="Money in the bank"),
+    free_transfers: int = Query(1, ge=0, description="Free transfers available this gameweek"),
+    horizon: int = Query(3, gt=0, le=8, description="Number of gameweeks to plan"),
+):
+    """Plan transfers over the next gameweeks for an existing squad."""
+    snapshot = await SnapshotService.aget()
+    try:
+        squad_ids = [int(x) for x in squad.split(",")]
+        result = await run_in_thread(planner.plan, snapshot.table.frame, snapshot.fdr_index, snapshot.gw,
+                                     squad_ids, bank, free_transfers, horizon)
+    except (ValueError, RuntimeError) as e:
+        return {"error": str(e)}
+    return {"gameweek": snapshot.gw, **result}
 
 @app.get("/player/impact")
-def player_impact(player_id: int):
+async def player_impact(player_id: int):
     """Return feature contributions for a single player."""
-    players, teams, fixtures, gw = FPLDataService.fetch_fpl_data()
-    fdr_map = FPLDataService.get_team_fdr(fixtures)
-    models = MLService.train_models(players, fdr_map)
+    snapshot = await SnapshotService.aget()
 
-    player = next((p for p in players if p["id"] == player_id), None)
+    player = snapshot.table.get(player_id)
     if not player:
         return {"error": "Player not found"}
-
-    # Enrich player
-    pos_map = {1: "GK", 2: "DEF", 3: "MID", 4: "FWD"}
-    pos = pos_map.get(player.get("element_type"), "UNK")
-
-    player["penalty_taker"] = 1 if pos in ["MID", "FWD"] and player.get("penalties_order") else 0
-    player["set_piece_taker"] = 1 if pos in ["MID", "FWD"] and (player.get("corners_and_indirect_freekicks_order") or player.get("direct_freekicks_order")) else 0
-    player["yellow_cards"] = player.get("yellow_cards", 0)
-    player["red_cards"] = player.get("red_cards", 0)
-    player["availability"] = (player.get("chance_of_playing_next_round", 100) or 100) / 100
-
-    predicted_points = MLService.predict_points(player, fdr_map, models)
-    pos_name = pos_map.get(player.get("element_type"), "UNK")
-    model_name = models[pos_name][2] if pos_name in models else "Unknown"
-
-    # Feature breakdown (simple proportional contribution based on features)
-    feature_impact = {
-        "goals_scored": player.get("goals_scored", 0),
-        "assists": player.get("assists", 0),
-        "clean_sheets": player.get("clean_sheets", 0) if pos in ["GK","DEF"] else 0,
-        "saves": player.get("saves", 0) if pos == "GK" else 0,
-        "penalty_set_piece": player["penalty_taker"] + player["set_piece_taker"],
-        "cards": -(player["yellow_cards"]*0.5 + player["red_cards"]*1.0),
-        "availability": player["availability"]
-    }
+    contributions = await run_in_thread(snapshot.contributions)
 
     return {
-        "player": f"{player['first_name']} {player['second_name']}",
-        "position": POSITIONS.get(player["element_type"], "UNK"),
-        "expected_points": predicted_points,
-        "feature_impact": feature_impact,
-        "model_used": model_name
+        "player": player["name"],
+        "position": player["position"],
+        "expected_points": player["expected_points"],
+        "feature_impact": contributions.player(snapshot.table.rows([player_id])[0], player["position"]),
+        "model_used": player["model_used"]
     }
 
 @app.get("/player/performance-trends")
-def player_performance_trends(player_id: int, n_gameweeks: int = 5):
-    """Return historical trends for a player."""
-    players, teams, fixtures, gw = FPLDataService.fetch_fpl_data()
-    fdr_map = FPLDataService.get_team_fdr(fixtures)
-    models = MLService.train_models(players, fdr_map)
+async def player_performance_trends(player_id: int, n_gameweeks: int = Query(5, gt=0, le=38)):
+    """Return per-gameweek actual and predicted points for a player."""
+    snapshot = await SnapshotService.aget()
 
-    player = next((p for p in players if p["id"] == player_id), None)
+    player = snapshot.table.get(player_id)
     if not player:
         return {"error": "Player not found"}
 
-    trends = []
-    # Use last n_gameweeks or mocked data from total_points / minutes
-    # Here we simulate; in a real app fetch from historical API or database
-    for i in range(n_gameweeks):
-        trends.append({
-            "gw": gw-i,
-            "actual_points": max(0, player.get("total_points",0)//(i+1)),
-            "predicted_points": round(MLService.predict_points(player, fdr_map, models),2)
-        })
+    latest = snapshot.gw or max(history.actuals.gameweeks(), default=0)
+    gws = [gw for gw in range(latest, latest - n_gameweeks, -1) if gw > 0]
     return {
-        "player": f"{player['first_name']} {player['second_name']}",
-        "position": POSITIONS.get(player["element_type"], "UNK"),
-        "trends": trends
+        "player": player["name"],
+        "position": player["position"],
+        "trends": history.player_trends(player_id, gws)
     }
 
 @app.get("/team/risk")
-def team_risk(team_ids: str = Query(..., description="Comma-separated list of player IDs")):
-    """Return risk scores for players based on availability, cards, and rotation."""
-    players, teams, fixtures, gw = FPLDataService.fetch_fpl_data()
-    fdr_map = FPLDataService.get_team_fdr(fixtures)
-    models = MLService.train_models(players, fdr_map)
-
-    team_ids = [int(x) for x in team_ids.split(",")]
-
-    result = []
-    for pid in team_ids:
-        p = next((pl for pl in players if pl["id"] == pid), None)
-        if not p:
-            continue
-        pos_map = {1: "GK", 2: "DEF", 3: "MID", 4: "FWD"}
-        pos = pos_map.get(p.get("element_type"), "UNK")
-
-        availability = (p.get("chance_of_playing_next_round", 100) or 100) / 100
-        cards_score = (p.get("yellow_cards", 0)*0.1 + p.get("red_cards", 0)*0.3)
-        rotation_risk = 0.2 if p.get("minutes", 0) < 60 else 0
-
-        risk_score = 0.5*(1-availability) + 0.3*cards_score + rotation_risk
-
-        result.append({
-            "name": f"{p['first_name']} {p['second_name']}",
-            "position": POSITIONS.get(p["element_type"], "UNK"),
-            "risk_score": round(risk_score,2),
-            "factors": {
-                "availability": round(0.5*(1-availability),2),
-                "cards": round(0.3*cards_score,2),
-                "rotation": round(rotation_risk,2)
-            }
-        })
-    return {"team_risk": result}
+async def team_risk(team_ids: str = Query(..., description="Comma-separated list of player IDs")):
+    """Return risk scores for players based on availability, cards, and rotation,
+    with their simulated points distribution and captaincy win-probabilities."""
+    snapshot = await SnapshotService.aget()
+    table = snapshot.table
+    rows = table.rows(parse_ids(team_ids))
+    simulation = await run_in_thread(snapshot.simulation)
+    team_risk = table.risk(rows)
+    for entry, row, prob in zip(team_risk, rows, simulation.captaincy(rows)):
+        entry["simulated_points"] = simulation.player(row)
+        entry["captain_probability"] = round(float(prob), 3)
+    return {"team_risk": team_risk}
 
 @app.get("/team/impact-summary")
-def team_impact_summary(team_ids: str = Query(..., description="Comma-separated list of player IDs")):
+async def team_impact_summary(team_ids: str = Query(..., description="Comma-separated list of player IDs")):
     """Aggregate feature contributions across a squad."""
-    players, teams, fixtures, gw = FPLDataService.fetch_fpl_data()
-    fdr_map = FPLDataService.get_team_fdr(fixtures)
-    models = MLService.train_models(players, fdr_map)
+    snapshot = await SnapshotService.aget()
+    table = snapshot.table
+    contributions = await run_in_thread(snapshot.contributions)
+    return table.impact(table.rows(parse_ids(team_ids)), contributions)
 
-    total_points = 0
-    summary = {
-        "goals":0, "assists":0, "clean_sheets":0, "saves":0, "penalty_set_piece":0, "cards":0, "availability":0
-    }
-    team_ids = [int(x) for x in team_ids.split(",")]
-
-    for pid in team_ids:
-        p = next((pl for pl in players if pl["id"] == pid), None)
-        if not p: continue
-        pos_map = {1: "GK", 2: "DEF", 3: "MID", 4: "FWD"}
-        pos = pos_map.get(p.get("element_type"), "UNK")
-
-        p["penalty_taker"] = 1 if pos in ["MID", "FWD"] and p.get("penalties_order") else 0
-        p["set_piece_taker"] = 1 if pos in ["MID", "FWD"] and (p.get("corners_and_indirect_freekicks_order") or p.get("direct_freekicks_order")) else 0
-        p["yellow_cards"] = p.get("yellow_cards",0)
-        p["red_cards"] = p.get("red_cards",0)
-        p["availability"] = (p.get("chance_of_playing_next_round",100) or 100)/100
-
-        ep = MLService.predict_points(p, fdr_map, models)
-        total_points += ep
-
-        summary["goals"] += p.get("goals_scored",0)
-        summary["assists"] += p.get("assists",0)
-        summary["clean_sheets"] += p.get("clean_sheets",0) if pos in ["GK","DEF"] else 0
-        summary["saves"] += p.get("saves",0) if pos=="GK" else 0
-        summary["penalty_set_piece"] += p["penalty_taker"] + p["set_piece_taker"]
-        summary["cards"] += p["yellow_cards"] + 2*p["red_cards"]
-        summary["availability"] += p["availability"]
 
-    return {
-        "total_predicted_points": round(total_points,2),
-        "feature_impact_summary": summary
-    }
+class SquadIds(BaseModel):
+    id: Optional[str] = None
+    player_ids: List[int]
+
+
+class BulkSquads(BaseModel):
+    squads: List[SquadIds]
+
+
+def stream_squads(squads, rows, compute):
+    """Yield one NDJSON line per squad."""
+    for squad, squad_rows in zip(squads, rows):
+        yield json.dumps({"id": squad.id, **compute(squad_rows)}) + "\n"
+
+
+@app.post("/team/risk/bulk")
+async def bulk_team_risk(body: BulkSquads):
+    """Risk scores for many squads, streamed back as NDJSON."""
+    snapshot = await SnapshotService.aget()
+    table = snapshot.table
+    rows = table.bulk_rows([s.player_ids for s in body.squads])
+    return StreamingResponse(stream_squads(body.squads, rows, lambda r: {"team_risk": table.risk(r)}),
+                             media_type="application/x-ndjson")
+
+class ManagerState(BaseModel):
+    id: Optional[str] = None
+    squad: List[int] = []
+    bank: float = 0.0
+    budget: Optional[float] = None
+    max_transfers: Optional[int] = None
+    locked: List[int] = []
+    excluded: List[int] = []
+    max_per_club: int = MAX_PER_CLUB
+    formations: Optional[List[str]] = None
+    risk: str = "neutral"
+
+
+class BatchManagers(BaseModel):
+    managers: List[ManagerState]
+
+
+@app.post("/team/batch")
+async def batch_teams(body: BatchManagers):
+    """Optimal squads for many managers, streamed back as NDJSON as each solve finishes."""
+    snapshot = await SnapshotService.aget()
+
+    async def lines():
+        async for result in BatchOptimizer.stream(snapshot, [m.dict() for m in body.managers]):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/team/impact-summary/bulk")
+async def bulk_team_impact_summary(body: BulkSquads):
+    """Impact summaries for many squads, streamed back as NDJSON."""
+    snapshot = await SnapshotService.aget()
+    table = snapshot.table
+    rows = table.bulk_rows([s.player_ids for s in body.squads])
+    contributions = await run_in_thread(snapshot.contributions)
+    return StreamingResponse(stream_squads(body.squads, rows, lambda r: table.impact(r, contributions)),
+                             media_type="application/x-ndjson")
+
+chat_messages = MessageParser()
 
-from fastapi import Request
-from fastapi.responses import JSONResponse
 
 @app.post("/chat")
 async def chat_endpoint(request: Request):
     data = await request.json()
     user_message = data.get("message", "")
-    # Simple logic, replace with your own agent logic if needed
+    # Player requests ("top 10 midfielders under 7.5m") become a PlayerQuery;
+    # team names are recognised once a snapshot has been built
+    current = SnapshotService.peek()
+    parser = current.index().messages if current is not None else chat_messages
+    try:
+        query = parser.parse(user_message)
+        if query is not None:
+            snapshot = await SnapshotService.aget()
+            players = snapshot.index().query(query)
+    except ValueError as e:
+        return JSONResponse({"reply": f"Sorry, {e}."})
+    if query is not None:
+        return JSONResponse({"reply": chat_reply(query, players), "query": query.text(), "players": players})
+
     if "top" in user_message.lower():
         reply = "You can see top players at /top or ask for a position like 'Show me top MID'."
     elif "team" in user_message.lower():
@@ -314,3 +388,13 @@ async def chat_endpoint(request: Request):
     else:
         reply = "Ask me about FPL teams, players, or stats!"
     return JSONResponse({"reply": reply})
+
+
+def chat_reply(query, players):
+    if not players:
+        return f"No players match {query.text()}."
+    lines = [f"Players for {query.text()}:"]
+    for i, p in enumerate(players, 1):
+        lines.append(f"{i}. {p['name']} ({p['team']}, {p['position']}) £{p['price']}m, "
+                     f"{p['expected_points']:.1f} xP")
+    return "\n".join(lines)
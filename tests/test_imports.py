@@ -0,0 +1,16 @@
+"""Import smoke test: every module of the app and the API entry point loads."""
+import importlib
+import pkgutil
+
+import pytest
+
+import app.services
+
+MODULES = ["main"] + [f"app.services.{m.name}" for m in pkgutil.iter_modules(app.services.__path__)]
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_module_imports(module):
+    for dependency in ("numpy", "fastapi"):
+        pytest.importorskip(dependency)
+    importlib.import_module(module)